@@ -1,8 +1,18 @@
-from config import collection, embed_model
-from utils import clean_text
+import os
+import argparse
+from glob import glob
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from config import get_collection, get_embed_model, startup_report, bump_collection_version, DATA_PATH, BM25_INDEX_PATH, VECTOR_STORE, VECTOR_STORE_PATH, MANIFEST_PATH, EMBED_BATCH_SIZE, PREFETCH_BATCHES, LOAD_WORKERS
+from config import CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP, PAGE_BATCH_SIZE, METRICS_ENABLED, INGEST_METRICS_PATH
+from lexical import BM25Index
+from vector_store import QuantizedStore
+from splitter import chunk_pages
+import metrics
+from utils import file_hash, chunk_ids, load_json, save_json, batched, prefetch
 
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.document_loaders import DirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 # step 1: setup datasources in Data/
@@ -10,77 +20,266 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 #step2: set up chroma database and embedding functions(in config.py)
 
 #step 3: load docs and split them into chunks
-def load_docs(DATA_PATH):
-    docs = []
+# everything below is a generator chain: pdf -> pages -> chunks -> cleaned chunks,
+# so only the pages and chunks of the batch currently being embedded are held in memory
+def list_pdfs(DATA_PATH):
+    return sorted(glob(os.path.join(DATA_PATH, "*.pdf")))
+
+# ingestion stage timings (see metrics.py): "ingest_load" per pdf page, "ingest_chunk" per page,
+# "ingest_embed" / "ingest_add" per batch. with LOAD_WORKERS > 1 the first two happen in the
+# worker processes and are not recorded
+metrics.enable(METRICS_ENABLED)
+
+def load_pages(pdf_path):
+    yield from metrics.timed_iter("ingest_load", PyPDFLoader(pdf_path).lazy_load()) # one page at a time (page content and metadata)
+
+text_splitter = RecursiveCharacterTextSplitter( # only used by CHUNKER = "compat"
+    chunk_size=CHUNK_SIZE, #each chunk size
+    chunk_overlap=CHUNK_OVERLAP,  # Overlap to preserve context(means next chunk repeats content of previous chunk(here it is 200 chars)
+    separators=["\n\n", "\n", ". ", " ", ""] # where to split as chunks
+)
+
+# chunker settings recorded per pdf in the manifest, a pdf chunked with other settings is redone.
+# entries written before this was recorded were made by the compat splitter at 1000/200
+CHUNKER_KEY = f"{CHUNKER}:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+LEGACY_CHUNKER_KEY = "compat:1000:200"
+
+def chunking(book_contents, source):
+    # pages are cleaned once and chunked in batches, chunks stay (page, start, end) spans until used
+    return chunk_pages(book_contents, source, os.path.basename(source), CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP,
+                       PAGE_BATCH_SIZE, text_splitter)
+
+def flatten_chunks(page_batches):
+    # (text, meta) per chunk of every batch, text is sliced out of its cleaned page only now
+    for batch in page_batches:
+        yield from batch
+
+def parse_pdf(pdf_path, source):
+    # runs inside a worker process: parse, split and clean one pdf.
+    # errors are returned instead of raised so one broken pdf never takes the pool down
     try:
-        loader = DirectoryLoader(DATA_PATH, glob="*.pdf", loader_cls=PyPDFLoader)
-        documents = loader.load() #object len will be equal to no of pages in all pdfs(contains page content and metadata
-        for content in documents:
-            docs.append(content)
+        return list(chunking(load_pages(pdf_path), source)), None # page batches, pickled back as pages + spans
     except Exception as e:
-        print(e)
-    return chunking(docs)
+        return None, f"{type(e).__name__}: {e}"
 
-def chunking(book_contents):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, #each chunk size
-        chunk_overlap=200,  # Overlap to preserve context(means next chunk repeats content of previous chunk(here it is 200 chars)
-        separators=["\n\n", "\n", ". ", " ", ""] # where to split as chunks
-    )
+def parse_pdfs(pdfs, workers):
+    """
+    Yields (pdf_path, chunks, error) for every (pdf_path, source) in pdfs, in the same order.
+    With workers <= 1 pdfs are parsed lazily in this process (chunks is a generator).
+    Otherwise parsing fans out over a process pool, at most 2 * workers pdfs are in
+    flight at a time so finished pdfs never pile up while the embedder catches up.
+    """
+    if workers <= 1:
+        for pdf_path, source in pdfs:
+            yield pdf_path, flatten_chunks(chunking(load_pages(pdf_path), source)), None
+        return
 
-    chunks = text_splitter.split_documents(book_contents)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        todo = iter(pdfs)
+        in_flight = deque()
+        for pdf_path, source in todo:
+            in_flight.append((pdf_path, pool.submit(parse_pdf, pdf_path, source)))
+            if len(in_flight) >= 2 * workers:
+                break
 
-    chunk_data = []
-    for i, chunk in enumerate(chunks):
-        chunk_data.append(chunk)
-    return chunk_data
+        while in_flight:
+            pdf_path, future = in_flight.popleft() # oldest first keeps the output order deterministic
+            for next_path, next_source in todo:
+                in_flight.append((next_path, pool.submit(parse_pdf, next_path, next_source)))
+                break
+            page_batches, error = future.result()
+            yield pdf_path, flatten_chunks(page_batches or []), error
 
 
 # step4: store chunks in db
-def store_chunks_inChroma(chunk_with_meta):
+def clear_collection():
     # Clear existing data
+    collection = get_collection()
     try:
         ids = collection.get()["ids"]
-        print("collection has ",len(collection.get()["ids"]), " entries")
+        print("collection has ",len(ids), " entries")
         print("Clearing existing collection data...")
-        collection.delete(ids=ids)  # Delete all existing documents(cause code reruns cause duplicates addition)
+        if ids:
+            collection.delete(ids=ids)
         print("Cleared")
         print("collection has ",len(collection.get()["ids"]), " entries\n")
     except Exception as e:
         print(f"Collection was empty or error clearing: {e}")
 
-    # Clean and filter chunks
-    chunk_contents = []
-    metas = []
-
-    for content in chunk_with_meta:
-        if content.page_content and isinstance(content.page_content, str) and content.page_content.strip():
-            text = clean_text(content.page_content) # to avoid error during tokenization
-            chunk_contents.append(text.strip())
-            metas.append({'title':content.metadata["title"]})
+    # forget file hashes too, otherwise sync would think everything is still stored
+    save_json(MANIFEST_PATH, {})
+    bump_collection_version()
 
+def store_chunks_inChroma(ids, chunk_contents, metas):
     if not chunk_contents:
-        print("No valid chunks to embed")
-        return False
+        return 0
+
+    with metrics.timer("ingest_embed"):
+        embeddings = get_embed_model().embed_documents(chunk_contents)
+    with metrics.timer("ingest_add"):
+        get_collection().upsert( # upsert so a rerun after a crash does not fail on ids that already made it in
+            embeddings=embeddings,
+            documents=chunk_contents,
+            metadatas=metas,
+            ids=ids
+        )
+    return len(chunk_contents)
+
+def sync_chunks_inChroma(data_path, workers=LOAD_WORKERS):
+    """
+    Incremental ingestion. Every pdf is hashed and compared against the manifest,
+    unchanged pdfs are skipped without even being parsed. Changed pdfs are streamed
+    page by page and embedded/added in batches of EMBED_BATCH_SIZE, only chunks whose
+    content hash is new get embedded and chunks that disappeared are deleted.
+    Chunks of pdfs that were removed from data_path are deleted as well.
+    With workers > 1 the changed pdfs are parsed on a process pool (see parse_pdfs).
+    """
+    collection = get_collection()
+    if not os.path.exists(MANIFEST_PATH) and collection.count() > 0:
+        # db built by the old wipe-and-rebuild code (doc1..docN ids), start over once
+        clear_collection()
+
+    manifest = load_json(MANIFEST_PATH, {}) # {source: {"file_hash": ..., "chunk_ids": [...]}}
+    if not os.path.exists(MANIFEST_PATH):
+        save_json(MANIFEST_PATH, manifest) # from here on the collection counts as managed by the manifest
+    stats = {"unchanged_files": 0, "changed_files": 0, "removed_files": 0, "failed_files": 0,
+             "added_chunks": 0, "kept_chunks": 0, "deleted_chunks": 0}
+
+    sources = set()
+    changed = {} # pdf_path -> (source, digest, manifest entry)
+    for pdf_path in list_pdfs(data_path):
+        source = pdf_path.replace("\\", "/")
+        sources.add(source)
+
+        digest = file_hash(pdf_path)
+        entry = manifest.get(source)
+        if entry and entry["file_hash"] == digest and entry.get("chunker", LEGACY_CHUNKER_KEY) == CHUNKER_KEY:
+            stats["unchanged_files"] += 1
+            continue
+        changed[pdf_path] = (source, digest, entry)
+
+    pdfs = [(pdf_path, source) for pdf_path, (source, _, _) in changed.items()]
+    for pdf_path, chunks, error in parse_pdfs(pdfs, workers):
+        source, digest, entry = changed[pdf_path]
+        if error:
+            # only this pdf is skipped, it stays out of the manifest so the next run retries it
+            print(f"failed to parse {source}: {error}")
+            stats["failed_files"] += 1
+            continue
+
+        if entry is None:
+            # recorded before the first upsert, so chunks of a run that stops half way through this
+            # pdf are still found (by source) if the pdf is removed before it is ingested completely
+            manifest[source] = {"file_hash": None, "chunker": CHUNKER_KEY, "chunk_ids": []}
+            save_json(MANIFEST_PATH, manifest)
+
+        old_ids = set(entry["chunk_ids"]) if entry else set()
+        ids = []
+        added = 0
+        try:
+            seen = Counter()
+            for batch in prefetch(batched(chunks, EMBED_BATCH_SIZE), PREFETCH_BATCHES):
+                texts = [text for text, _ in batch]
+                batch_ids = chunk_ids(source, texts, seen)
+                ids.extend(batch_ids)
+
+                new = [i for i, chunk_id in enumerate(batch_ids) if chunk_id not in old_ids]
+                if new:
+                    # chunks added by an earlier run that crashed half way through this pdf
+                    stored = set(collection.get(ids=[batch_ids[i] for i in new], include=[])["ids"])
+                    new = [i for i in new if batch_ids[i] not in stored]
+                added += store_chunks_inChroma(
+                    [batch_ids[i] for i in new], [texts[i] for i in new], [batch[i][1] for i in new]
+                )
+        except Exception as e:
+            # batches already added stay in chroma, the manifest is not updated so the next run resumes this pdf
+            print(f"stopped at {source} after {added} new chunks: {type(e).__name__}: {e}")
+            stats["failed_files"] += 1
+            continue
+
+        stats["added_chunks"] += added
+        stats["kept_chunks"] += len(ids) - added
+
+        # every chunk stored for this source that is not in the new version, including the ones an
+        # earlier interrupted run added and no manifest entry lists
+        stored_ids = collection.get(where={"source": source}, include=[])["ids"]
+        stale_ids = list((old_ids | set(stored_ids)) - set(ids))
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            stats["deleted_chunks"] += len(stale_ids)
+
+        manifest[source] = {"file_hash": digest, "chunker": CHUNKER_KEY, "chunk_ids": ids}
+        save_json(MANIFEST_PATH, manifest) # saved per file so a crash only redoes the current pdf
+        stats["changed_files"] += 1
+        print(f"{source}: {added} new chunks, {len(stale_ids)} removed")
+
+    # pdfs which were deleted from the data folder
+    for source in [s for s in manifest if s not in sources]:
+        # by source, not by the manifest's chunk_ids, which miss the chunks of an interrupted run
+        stale_ids = collection.get(where={"source": source}, include=[])["ids"]
+        collection.delete(where={"source": source})
+        manifest.pop(source)
+        stats["deleted_chunks"] += len(stale_ids)
+        stats["removed_files"] += 1
+        save_json(MANIFEST_PATH, manifest)
+        print(f"{source}: removed, {len(stale_ids)} chunks deleted")
+
+    if stats["added_chunks"] or stats["deleted_chunks"] or stats["changed_files"] or stats["removed_files"]:
+        bump_collection_version() # after the last write, never before it
+    for name, value in stats.items():
+        metrics.count(f"ingest_{name}", value)
+    return stats
+
+def iter_collection(include, page_size=1000): # pages through the whole collection without loading it at once
+    collection = get_collection()
+    offset = 0
+    while True:
+        page = collection.get(include=include, limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+def build_lexical_index():
+    # keyword index for hybrid search, rebuilt from what is in chroma so it always matches the collection
+    docs = ((chunk_id, doc) for page in iter_collection(["documents"])
+            for chunk_id, doc in zip(page["ids"], page["documents"]))
+    index = BM25Index.build(docs)
+    index.save(BM25_INDEX_PATH)
+    bump_collection_version() # answers cached before now may come from the old index
+    print(f"bm25 index: {len(index.ids)} chunks, {len(index.terms)} terms")
+    return index
 
-    print("Started embedding...")
-    embeddings = embed_model.embed_documents(chunk_contents)
-    ids = [f"doc{id}" for id in range(1, len(chunk_contents) + 1)]
-    print("embeddings done.")
+def build_vector_store(dtype):
+    # int8/float16 copy of every embedding in chroma plus the float32 rows for the re-rank,
+    # written page by page into memory-mapped files
+    pages = ((page["ids"], page["embeddings"]) for page in iter_collection(["embeddings"]))
+    store = QuantizedStore.build(VECTOR_STORE_PATH, pages, get_collection().count(), dtype)
+    bump_collection_version()
+    if store is not None:
+        print(f"{dtype} vector store: {len(store)} chunks, {store.vectors.nbytes / 1e6:.2f} MB "
+              f"(+ {store.exact.nbytes / 1e6:.2f} MB float32 for the re-rank, paged in per candidate)")
+    return store
 
-    print("adding to collection...")
-    collection.add(
-        embeddings=embeddings,
-        documents=chunk_contents,
-        metadatas=metas,
-        ids=ids
-    )
-    print("added to collection")
-    return True
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the pdfs in Data/ into the chroma collection")
+    parser.add_argument("--data", default=DATA_PATH, help="folder containing the pdfs")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="processes used to parse pdfs (1 = no pool)")
+    parser.add_argument("--rebuild", action="store_true", help="wipe the collection and re-embed everything")
+    args = parser.parse_args()
 
+    if args.rebuild:
+        clear_collection()
 
-chunk_data = load_docs("Data/Money")
-flag = store_chunks_inChroma(chunk_data)
-if flag:
+    stats = sync_chunks_inChroma(args.data, args.workers)
+    print(stats)
+    changed = stats["changed_files"] or stats["removed_files"] or args.rebuild
+    if changed or not os.path.exists(f"{BM25_INDEX_PATH}.json"):
+        build_lexical_index()
+    if VECTOR_STORE != "chroma" and (changed or not os.path.exists(f"{VECTOR_STORE_PATH}.json")
+                                     or not os.path.exists(f"{VECTOR_STORE_PATH}.float.npy")):
+        build_vector_store(VECTOR_STORE)
     print("Database successfully created.")
+    startup_report()
+    metrics.dump(INGEST_METRICS_PATH)
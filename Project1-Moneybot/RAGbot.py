@@ -1,33 +1,200 @@
-from config import embed_model, collection
-from langchain_groq import ChatGroq
+from config import get_embed_model, get_collection, get_llm, collection_version, warm_up, startup_report, WARM_UP_ON_START
+from config import SERVE_ASYNC, STREAM_ANSWERS, SERVE_CONCURRENCY, BATCH_WINDOW_MS, MAX_QUERY_BATCH
+from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL
+from config import SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_PATH, SEMANTIC_CACHE_SAVE_EVERY
+from config import TOP_K, SIMILARITY_CUTOFF, HYBRID_SEARCH, HYBRID_CANDIDATES, RRF_K, KEYWORD_MATCH_CUTOFF, BM25_INDEX_PATH
+from config import CONTEXT_TOKEN_BUDGET, VECTOR_STORE, VECTOR_STORE_PATH, BRUTE_FORCE_LIMIT, RERANK_OVERFETCH
+from config import METRICS_ENABLED, METRICS_PATH, METRICS_DUMP_INTERVAL, METRICS_PORT, METRICS_HOST
+from cache import TTLCache, SemanticCache
+from context import pack_context
+from lexical import BM25Index, reciprocal_rank_fusion
+from vector_store import QuantizedStore, exact_rerank
+from batching import MicroBatcher
+import metrics
+import os
+import time
+import atexit
+import asyncio
+import numpy as np
 from langchain.prompts import PromptTemplate
-import gradio as gr
+
+# repeated questions skip the embedder, and for answers also chroma and the llm
+query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+answer_cache = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+# paraphrases of earlier questions reuse their answer, it uses the same query embedding as search_db
+semantic_cache = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_PATH)
+semantic_cache.load()
+atexit.register(semantic_cache.save)
+unsaved_answers = 0
+
+# stage timings and counters (see metrics.py), nothing is recorded unless METRICS_ENABLED
+metrics.enable(METRICS_ENABLED)
+atexit.register(metrics.dump, METRICS_PATH)
+
+def normalise_query(user_query): # "How do I SAVE  money?" and "how do i save money?" share cache entries
+    return " ".join(user_query.lower().split())
+
+def embed_query(user_query):
+    return embed_queries([user_query])[0]
+
+def embed_queries(user_queries):
+    # cached queries are looked up, the rest is embedded in one embed_documents call
+    keys = [normalise_query(q) for q in user_queries]
+    embeddings = [query_cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    metrics.count("queries_embedded", len(missing))
+    if len(missing) == 1:
+        with metrics.timer("query_embed"):
+            embeddings[missing[0]] = get_embed_model().embed_query(user_queries[missing[0]]) # returns one vector
+    elif missing:
+        with metrics.timer("query_embed"):
+            vectors = get_embed_model().embed_documents([user_queries[i] for i in missing])
+        for i, embedding in zip(missing, vectors):
+            embeddings[i] = embedding
+    for i in missing:
+        query_cache.set(keys[i], embeddings[i])
+    return embeddings
 
 # step 5: find relevant results from user query and get answers from llm
 def search_db(user_query):
-    user_embeddings = embed_model.embed_query(user_query) # returns one vector
+    return retrieve([(user_query, embed_query(user_query))])[0]
 
-    results = collection.query(
-        query_embeddings = user_embeddings,
-        n_results = 5,
-        include = ["documents", "metadatas", "distances"] # # 'ids', 'documents', 'metadatas', and 'distances' are returned
-    )
+_loaded = {} # path -> (file stamp, object), see load_if_changed
+
+def load_if_changed(path, loader):
+    # (re)loads an index written by Create_db whenever its file on disk changes
+    try:
+        stat = os.stat(f"{path}.json")
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+    if path not in _loaded or _loaded[path][0] != stamp:
+        _loaded[path] = (stamp, loader(path))
+    return _loaded[path][1]
+
+def lexical_index():
+    return load_if_changed(BM25_INDEX_PATH, BM25Index.load)
+
+def vector_store():
+    return load_if_changed(VECTOR_STORE_PATH, QuantizedStore.load)
+
+def chunk_dict(chunk_id, doc, meta, similarity):
+    return {"id": chunk_id, "content": doc, "title": meta["title"], "similarity": similarity, "keyword_match": 0.0}
+
+def dense_search(query_embeddings, n_results):
+    """
+    Dense top n_results per query as {chunk_id: chunk} (best first).
+    VECTOR_STORE == "chroma": chroma's hnsw index as is.
+    Otherwise candidates (n_results * RERANK_OVERFETCH) come from a numpy brute force scan of the
+    quantized store (small corpora, up to BRUTE_FORCE_LIMIT chunks) or from chroma (larger ones),
+    and are re-ranked with their exact float32 embeddings from the store's float memmap, so the
+    final order is deterministic. Only documents and metadatas are read from chroma.
+    """
+    store = vector_store() if VECTOR_STORE != "chroma" else None
+    if store is None:
+        with metrics.timer("chroma_query"):
+            results = get_collection().query(
+                query_embeddings = query_embeddings,
+                n_results = n_results,
+                include = ["documents", "metadatas", "distances"] # # 'ids', 'documents', 'metadatas', and 'distances' are returned
+            )
+
+        #formatting the results
+        all_chunks = []
+        for q in range(len(query_embeddings)):
+            all_chunks.append({
+                # Convert distance to similarity(more distnace = less similar)
+                results["ids"][q][i]: chunk_dict(results["ids"][q][i], doc, results["metadatas"][q][i], 1 - results["distances"][q][i])
+                for i, doc in enumerate(results["documents"][q])
+            })
+        return all_chunks
+
+    fetch = n_results * RERANK_OVERFETCH
+    if len(store) <= BRUTE_FORCE_LIMIT:
+        with metrics.timer("vector_store_search"):
+            candidates = [[chunk_id for chunk_id, _ in hits] for hits in store.search(query_embeddings, fetch)]
+    else:
+        with metrics.timer("chroma_query"):
+            candidates = get_collection().query(query_embeddings=query_embeddings, n_results=fetch, include=[])["ids"]
+
+    # ids chroma has but the store does not (added since Create_db built it) are left out of the re-rank
+    with metrics.timer("exact_rerank"):
+        vectors = store.exact_vectors([chunk_id for ids in candidates for chunk_id in ids])
+        ranked = [exact_rerank(embedding, [(chunk_id, vectors[chunk_id]) for chunk_id in ids if chunk_id in vectors], n_results)
+                  for embedding, ids in zip(query_embeddings, candidates)]
+
+    # text and metadata of the final chunks only
+    found = {} # chunk_id -> (doc, meta)
+    wanted = list({chunk_id for hits in ranked for chunk_id, _ in hits})
+    if wanted:
+        with metrics.timer("chroma_get"):
+            rows = get_collection().get(ids=wanted, include=["documents", "metadatas"])
+        for i, chunk_id in enumerate(rows["ids"]):
+            found[chunk_id] = (rows["documents"][i], rows["metadatas"][i])
+
+    return [{chunk_id: chunk_dict(chunk_id, *found[chunk_id], similarity) for chunk_id, similarity in hits if chunk_id in found}
+            for hits in ranked]
+
+def retrieve(queries):
+    """
+    queries: list of (user_query, query_embedding). Runs one dense search for all of them
+    and, with HYBRID_SEARCH, a bm25 search per query whose ranking is fused with the dense
+    one (reciprocal rank fusion). Returns the TOP_K chunks of every query, best first.
+    """
+    index = lexical_index() if HYBRID_SEARCH else None
+    all_chunks = dense_search([embedding for _, embedding in queries], HYBRID_CANDIDATES if index else TOP_K)
+
+    if index is None:
+        return [list(dense.values())[:TOP_K] for dense in all_chunks]
+
+    with metrics.timer("bm25_search"):
+        keyword_hits = [index.search(user_query, HYBRID_CANDIDATES) for user_query, _ in queries]
+    fused = []
+    for dense, hits in zip(all_chunks, keyword_hits):
+        ranking = reciprocal_rank_fusion([list(dense), [chunk_id for chunk_id, _, _ in hits]], RRF_K)
+        fused.append(ranking[:TOP_K])
+
+    # chunks found only by keywords: fetch their text and compute their dense similarity exactly
+    missing = {chunk_id for dense, top in zip(all_chunks, fused) for chunk_id in top if chunk_id not in dense}
+    extra = {}
+    if missing:
+        # with a vector store the embeddings come from its float memmap, not from chroma
+        store = vector_store() if VECTOR_STORE != "chroma" else None
+        vectors = store.exact_vectors(missing) if store is not None else {}
+        include = ["documents", "metadatas"] if store is not None else ["documents", "metadatas", "embeddings"]
+        with metrics.timer("chroma_get"):
+            found = get_collection().get(ids=list(missing), include=include)
+        for i, chunk_id in enumerate(found["ids"]):
+            vector = vectors.get(chunk_id) if store is not None else found["embeddings"][i]
+            if vector is not None:
+                extra[chunk_id] = (found["documents"][i], found["metadatas"][i], np.asarray(vector, dtype=np.float32))
+
+    relevant = []
+    for (_, embedding), dense, hits, top in zip(queries, all_chunks, keyword_hits, fused):
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        coverage = {chunk_id: match for chunk_id, _, match in hits}
+        chunks = []
+        for chunk_id in top:
+            if chunk_id in dense:
+                chunk = dense[chunk_id]
+            elif chunk_id in extra:
+                doc, meta, vector = extra[chunk_id]
+                norms = np.linalg.norm(query_vector) * np.linalg.norm(vector)
+                chunk = chunk_dict(chunk_id, doc, meta, float(query_vector @ vector / norms) if norms else 0.0)
+            else: # deleted since the bm25 index was built
+                continue
+            chunk["keyword_match"] = coverage.get(chunk_id, 0.0)
+            chunks.append(chunk)
+        relevant.append(chunks)
+    return relevant
+
+# async serving: concurrent requests share embedder and chroma calls
+embed_batcher = MicroBatcher(embed_queries, BATCH_WINDOW_MS, MAX_QUERY_BATCH)
+search_batcher = MicroBatcher(retrieve, BATCH_WINDOW_MS, MAX_QUERY_BATCH)
 
-    #formatting the results
-    relevant_chunks = []
-    for i, doc in enumerate(results["documents"][0]):
-        relevant_chunks.append({
-            "content": doc,
-            "title": results["metadatas"][0][i]["title"],
-            "similarity": 1 - results["distances"][0][i]  # Convert distance to similarity(more distnace = less similar)
-        })
-
-    return relevant_chunks
-
-def answer_the_question(context, query, llm):
-    prompt_template = PromptTemplate(
-        input_variables=["context", "question"],
-        template="""
+prompt_template = PromptTemplate(
+    input_variables=["context", "question"],
+    template="""
     You are a chatbot version of great scientist feynmen who explains things in simple. 
     Your job is to give clear, friendly, and practical insights.
 
@@ -43,38 +210,208 @@ def answer_the_question(context, query, llm):
         4. Provide answer no more than 300 words and in short paragraphs.
         4. End with a short "Good actions to take" summary.
     """
-    )
+)
 
-    prompt = prompt_template.format(context=context, question=query)
-    response = llm.invoke(prompt)
-    return response.content
+context_totals = {"requests": 0, "tokens_before": 0, "tokens_after": 0} # running totals of pack_context stats
 
+def build_context(relevant_chunks):
+    usable = [chunk for chunk in relevant_chunks
+              if chunk['similarity'] > SIMILARITY_CUTOFF or chunk['keyword_match'] >= KEYWORD_MATCH_CUTOFF]
+    if not usable:
+        return ""
 
-def main(user_query):
-    relevant_chunks = search_db(user_query)
-    context = "\n\n".join([
-            f"From {chunk['title']}:\n{chunk['content']}" for chunk in relevant_chunks if chunk['similarity'] > 0.4
-        ])
+    # overlapping chunks of the same book are merged and the result is kept within the token budget
+    with metrics.timer("context_build"):
+        context, stats = pack_context(usable, CONTEXT_TOKEN_BUDGET)
+    metrics.count("context_tokens_saved", stats["tokens_saved"])
+    context_totals["requests"] += 1
+    context_totals["tokens_before"] += stats["tokens_before"]
+    context_totals["tokens_after"] += stats["tokens_after"]
+    print(f"context: {stats['chunks']} chunks -> {stats['passages']} passages, "
+          f"{stats['tokens_after']} tokens ({stats['tokens_saved']} saved)")
+    return context
+
+NO_CONTEXT_ANSWER = "This chatbot helps explain ideas related to money. Please provide a question related to money or finance."
+
+
+def cache_stats(): # hit rates of the three caches
+    return {"query": query_cache.stats(), "answer": answer_cache.stats(), "semantic": semantic_cache.stats()}
+
+# one request as a generator of steps: it yields (kind, argument) for every i/o it needs and gets
+# the result sent back, ("output", text) is a reply for the caller. run_steps / arun_steps carry the
+# i/o out blocking or through the micro batchers, so the request logic exists only once
+def remember_steps(cache_key, embedding, llm_answer):
+    global unsaved_answers
+    answer_cache.set(cache_key, llm_answer)
+    semantic_cache.set(embedding, llm_answer, cache_key[1], cache_key[0])
+    unsaved_answers += 1
+    if unsaved_answers >= SEMANTIC_CACHE_SAVE_EVERY:
+        unsaved_answers = 0
+        yield ("save", None)
 
+def answer_steps(user_query, stream=False):
+    """
+    Steps of one question: caches, retrieval, context, llm, caching the answer. With stream the
+    answer so far is output every time new tokens arrive, otherwise once at the end; cached
+    answers come out in one piece straight away.
+    """
+    metrics.count("requests")
+    started = time.perf_counter()
+    # the collection version is part of the key, so answers are dropped once Create_db changes the db
+    version = collection_version()
+    cache_key = (normalise_query(user_query), version)
+    cached_answer = answer_cache.get(cache_key)
+    if cached_answer is not None:
+        metrics.count("answer_cache_hits")
+        metrics.observe("request", time.perf_counter() - started)
+        yield ("output", cached_answer)
+        return
+
+    embedding = yield ("embed", user_query)
+    cached_answer = semantic_cache.get(embedding, version)
+    if cached_answer is not None:
+        metrics.count("semantic_cache_hits")
+        answer_cache.set(cache_key, cached_answer) # next exact repeat does not even need the embedding
+        metrics.observe("request", time.perf_counter() - started)
+        yield ("output", cached_answer)
+        return
+
+    relevant_chunks = yield ("search", (user_query, embedding))
+    context = build_context(relevant_chunks)
     if not context:
-        return "This chatbot helps explain ideas related to money. Please provide a question related to money or finance."
+        metrics.count("no_context_answers")
+        yield from remember_steps(cache_key, embedding, NO_CONTEXT_ANSWER)
+        metrics.observe("request", time.perf_counter() - started)
+        yield ("output", NO_CONTEXT_ANSWER)
+        return
+
+    prompt = prompt_template.format(context=context, question=user_query)
+    llm_started = time.perf_counter()
+    if stream:
+        llm_answer = ""
+        chunks = yield ("stream", prompt)
+        while (chunk := (yield ("next_chunk", chunks))) is not None:
+            if not llm_answer and chunk.content: # "llm_first_token": how long the reply box stays empty
+                metrics.observe("llm_first_token", time.perf_counter() - llm_started)
+            llm_answer += chunk.content
+            yield ("output", llm_answer)
+    else:
+        llm_answer = yield ("llm", prompt)
+    metrics.observe("llm", time.perf_counter() - llm_started)
+    yield from remember_steps(cache_key, embedding, llm_answer)
+    metrics.observe("request", time.perf_counter() - started)
+    if not stream:
+        yield ("output", llm_answer)
+
+async def next_chunk(chunks):
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return None
 
+async def save_semantic_cache():
+    await asyncio.to_thread(semantic_cache.save) # pickling the cache must not stall the event loop
 
-    llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0)
-    llm_answer = answer_the_question(context, user_query, llm)
-    return llm_answer
+async def ainvoke_llm(prompt):
+    return (await get_llm().ainvoke(prompt)).content
 
-# Gradio UI
-iface = gr.Interface(
-    fn=main, # Whenever the user sends input, call this Python function.
-    inputs=gr.Textbox(lines=2, placeholder="Type your message..."),
-    outputs=gr.Textbox(label="Chatbot Reply", lines=10),
-    title="PsycheMoney bot",
-    description="""Welcome to the night shift. I'm your personal finance assistant based on 'The Psychology of Money'. Ask me anything about saving, 
+async def astream_llm(prompt):
+    return get_llm().astream(prompt).__aiter__()
+
+SYNC_STEPS = {
+    "embed": embed_query,
+    "search": lambda request: retrieve([request])[0],
+    "llm": lambda prompt: get_llm().invoke(prompt).content,
+    "stream": lambda prompt: iter(get_llm().stream(prompt)),
+    "next_chunk": lambda chunks: next(chunks, None),
+    "save": lambda _: semantic_cache.save(),
+}
+
+ASYNC_STEPS = { # concurrent requests share embedder and chroma calls through the micro batchers
+    "embed": lambda user_query: embed_batcher.submit(user_query),
+    "search": lambda request: search_batcher.submit(request),
+    "llm": ainvoke_llm,
+    "stream": astream_llm,
+    "next_chunk": next_chunk,
+    "save": lambda _: save_semantic_cache(),
+}
+
+def run_steps(steps):
+    # carries out the steps' i/o blocking, yields their outputs
+    result = None
+    while True:
+        try:
+            kind, argument = steps.send(result)
+        except StopIteration:
+            return
+        if kind == "output":
+            result = None
+            yield argument
+        else:
+            result = SYNC_STEPS[kind](argument)
+
+async def arun_steps(steps):
+    # carries out the steps' i/o on the event loop, yields their outputs
+    result = None
+    while True:
+        try:
+            kind, argument = steps.send(result)
+        except StopIteration:
+            return
+        if kind == "output":
+            result = None
+            yield argument
+        else:
+            result = await ASYNC_STEPS[kind](argument)
+
+def main(user_query):
+    answer = None
+    for answer in run_steps(answer_steps(user_query)):
+        pass
+    return answer
+
+async def amain(user_query):
+    answer = None
+    async for answer in arun_steps(answer_steps(user_query)):
+        pass
+    return answer
+
+# streaming versions: yield the answer so far every time new tokens arrive
+def main_stream(user_query):
+    yield from run_steps(answer_steps(user_query, stream=True))
+
+async def amain_stream(user_query):
+    async for answer in arun_steps(answer_steps(user_query, stream=True)):
+        yield answer
+
+def pick_handler():
+    if STREAM_ANSWERS:
+        return amain_stream if SERVE_ASYNC else main_stream
+    return amain if SERVE_ASYNC else main
+
+# Gradio UI, built on demand so the pipeline can be imported as a library (e.g. by benchmark.py) without gradio
+def build_interface():
+    import gradio as gr
+    return gr.Interface(
+        fn=pick_handler(), # Whenever the user sends input, call this Python function.
+        inputs=gr.Textbox(lines=2, placeholder="Type your message..."),
+        outputs=gr.Textbox(label="Chatbot Reply", lines=10),
+        title="PsycheMoney bot",
+        description="""Welcome to the night shift. I'm your personal finance assistant based on 'The Psychology of Money'. Ask me anything about saving, 
                 investing, or money psychology in this digital realm."""
-)
+    )
 
-iface.launch()  # runs a local server and opens UI in browser
+if __name__ == "__main__":
+    iface = build_interface()
+    if WARM_UP_ON_START:
+        warm_up() # model + db are ready before the first request instead of during it
+    startup_report()
+    if METRICS_ENABLED:
+        metrics.dump_every(METRICS_PATH, METRICS_DUMP_INTERVAL)
+        if METRICS_PORT:
+            metrics.serve(METRICS_PORT, METRICS_HOST)
+    iface.queue(default_concurrency_limit=SERVE_CONCURRENCY) # how many requests are handled at the same time
+    iface.launch()  # runs a local server and opens UI in browser
 
 
 
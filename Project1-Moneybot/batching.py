@@ -0,0 +1,53 @@
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent coroutines for up to `window_ms` milliseconds
+    (or until `max_batch` items are waiting) and hands them to `fn` in one call.
+    `fn` takes a list of items and returns a list of results in the same order, it runs
+    in a worker thread so the event loop keeps serving other requests meanwhile.
+    """
+    def __init__(self, fn, window_ms, max_batch):
+        self.fn = fn
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.batches = 0 # calls made to fn
+        self.items = 0 # items passed to fn, items / batches = average batch size
+        self._pending = [] # (item, future)
+        self._timer = None
+        self._tasks = set() # keeps running batches referenced until they finish
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush, loop)
+        return await future
+
+    def _flush(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await asyncio.to_thread(self.fn, [item for item, _ in batch])
+        except Exception as e: # every caller in the batch sees the error
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done(): # caller may have been cancelled
+                future.set_result(result)
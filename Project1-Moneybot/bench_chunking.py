@@ -0,0 +1,111 @@
+import re
+import os
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+from langchain_core.documents import Document
+from config import CHUNK_SIZE, CHUNK_OVERLAP, PAGE_BATCH_SIZE
+from Create_db import list_pdfs, load_pages, text_splitter
+from splitter import chunk_pages
+
+# normalise + chunk throughput of the old pipeline (RecursiveCharacterTextSplitter, then the
+# three-regex clean_text per chunk) against the span chunker in compat and native mode.
+# pages are loaded up front, so pdf parsing is not part of the numbers.
+#   python bench_chunking.py                          # pdfs in Data/Money, synthetic pages if none
+#   python bench_chunking.py --synthetic 2000 --out chunking.json
+
+
+def legacy_clean_text(text): # clean_text as it was before the single pass version
+    text = re.sub(r'\s+', ' ', text)
+    text = text.strip()
+    text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\'\"]+', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_chunks(pages, source):
+    chunks = []
+    for page in pages:
+        for content in text_splitter.split_documents([page]):
+            if content.page_content and content.page_content.strip():
+                text = legacy_clean_text(content.page_content)
+                if text:
+                    chunks.append((text, {"title": content.metadata.get("title", os.path.basename(source)), "source": source}))
+    return chunks
+
+
+def span_chunks(mode):
+    return lambda pages, source: list(chunk_pages(pages, source, os.path.basename(source), mode, CHUNK_SIZE,
+                                                  CHUNK_OVERLAP, PAGE_BATCH_SIZE, text_splitter))
+
+
+def synthetic_pages(count, seed=0):
+    # pdf-like pages: sentences, line breaks, double spaces, bullets and the odd symbol
+    rng = random.Random(seed)
+    words = ["money", "saving", "compounding", "risk", "luck", "wealth", "investor", "time", "market",
+             "behaviour", "freedom", "years", "interest", "spend", "enough", "history", "tails", "room", "error"]
+    pages = []
+    for i in range(count):
+        sentences = []
+        while sum(map(len, sentences)) < 2500:
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(5, 20))).capitalize()
+            sentences.append(sentence + rng.choice([". ", ".\n", ".  ", ". • ", "; ", "! ", ".\n\n", " – "]))
+        pages.append(Document(page_content="".join(sentences), metadata={"page": i}))
+    return pages
+
+
+def measure(fn, pages, source):
+    started = time.perf_counter()
+    result = fn(pages, source)
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start() # second run, tracemalloc slows python down too much to time the first
+    result = fn(pages, source)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chars/sec and memory of the chunking pipelines")
+    parser.add_argument("--data", default="Data/Money", help="folder with pdfs")
+    parser.add_argument("--synthetic", type=int, default=0, help="use this many synthetic pages instead of pdfs")
+    parser.add_argument("--out", help="also write the report to this json file")
+    args = parser.parse_args()
+
+    pdfs = [] if args.synthetic else list_pdfs(args.data)
+    if pdfs:
+        corpus = [(pdf_path.replace("\\", "/"), list(load_pages(pdf_path))) for pdf_path in pdfs]
+    else:
+        corpus = [("synthetic.pdf", synthetic_pages(args.synthetic or 500))]
+    chars = sum(len(page.page_content) for _, pages in corpus for page in pages)
+    report = {"files": len(corpus), "pages": sum(len(pages) for _, pages in corpus), "chars": chars,
+              "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "methods": {}}
+
+    outputs = {}
+    for name, fn in [("splitter", legacy_chunks), ("compat", span_chunks("compat")), ("native", span_chunks("native"))]:
+        total_seconds = total_retained = peak = 0
+        chunks = []
+        for source, pages in corpus:
+            result, seconds, retained, file_peak = measure(fn, pages, source)
+            total_seconds += seconds
+            total_retained += retained
+            peak = max(peak, file_peak)
+            chunks.extend(result if name == "splitter" else [chunk for batch in result for chunk in batch])
+        outputs[name] = chunks
+        report["methods"][name] = {"chunks": len(chunks), "seconds": round(total_seconds, 4),
+                                   "chars_per_s": round(chars / total_seconds), "retained_bytes": total_retained,
+                                   "peak_bytes": peak}
+
+    report["compat_identical"] = outputs["compat"] == outputs["splitter"]
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
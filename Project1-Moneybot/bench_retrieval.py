@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from config import get_collection, get_embed_model, TOP_K, RERANK_OVERFETCH
+from vector_store import QuantizedStore, unit_rows, exact_rerank
+from Create_db import iter_collection
+
+# compares the dense search options on the current collection: chroma's hnsw index, numpy brute
+# force over the int8 / float16 store, and both followed by an exact float32 re-rank.
+# ground truth is an exact float32 brute force over every embedding in chroma. rss_growth_mb is
+# how much the process' resident memory grew while a method ran (memmapped pages it touched included).
+#   python bench_retrieval.py                       # queries = perturbed chunk embeddings
+#   python bench_retrieval.py --queries questions.txt  # one question per line, embedded with the real model
+
+
+def timed(fn, queries):
+    # runs fn once per query, returns (results, mean latency in ms)
+    started = time.perf_counter()
+    results = [fn(query) for query in queries]
+    return results, (time.perf_counter() - started) * 1000 / max(1, len(queries))
+
+
+def rss_mb():
+    # current resident set size in MB, None where /proc is not available
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def recall(results, truth):
+    return float(np.mean([len(set(got) & set(want)) / len(want) for got, want in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recall@k and latency of the dense search options")
+    parser.add_argument("--queries", help="text file with one question per line")
+    parser.add_argument("--samples", type=int, default=200, help="synthetic queries when --queries is not given")
+    parser.add_argument("--noise", type=float, default=0.3, help="noise added to the sampled chunk embeddings")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the report to this json file")
+    args = parser.parse_args()
+
+    ids, rows = [], []
+    for page in iter_collection(["embeddings"]):
+        ids.extend(page["ids"])
+        rows.extend(page["embeddings"])
+    if not ids:
+        print("collection is empty, run Create_db.py first")
+        return
+    matrix = unit_rows(rows)
+    row_of = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        queries = unit_rows(get_embed_model().embed_documents(texts))
+    else:
+        rng = np.random.default_rng(args.seed)
+        picked = matrix[rng.integers(0, len(ids), args.samples)]
+        queries = unit_rows(picked + rng.normal(0, args.noise / np.sqrt(matrix.shape[1]), picked.shape))
+
+    k = min(args.top_k, len(ids))
+    fetch = k * RERANK_OVERFETCH
+    truth = [[ids[i] for i in np.argsort(-(matrix @ query), kind="stable")[:k]] for query in queries]
+    rerank = lambda query, candidates: [chunk_id for chunk_id, _ in exact_rerank(query, [(c, matrix[row_of[c]]) for c in candidates], k)]
+    chroma = lambda query, n: get_collection().query(query_embeddings=[query.tolist()], n_results=n, include=[])["ids"][0]
+
+    report = {"chunks": len(ids), "dim": int(matrix.shape[1]), "queries": len(queries), "top_k": k,
+              "overfetch": RERANK_OVERFETCH, "float32_bytes": int(matrix.nbytes), "methods": {}}
+
+    def record(name, fn, extra=None):
+        before = rss_mb()
+        results, latency = timed(fn, queries)
+        after = rss_mb()
+        growth = round(after - before, 2) if before is not None and after is not None else None
+        report["methods"][name] = {"recall": round(recall(results, truth), 4), "latency_ms": round(latency, 3),
+                                   "rss_growth_mb": growth, **(extra or {})}
+
+    record("chroma hnsw", lambda query: chroma(query, k))
+    record("chroma hnsw + rerank", lambda query: rerank(query, chroma(query, fetch)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        for dtype in ("int8", "float16"):
+            path = os.path.join(folder, dtype)
+            pages = ((ids[i:i + 1000], matrix[i:i + 1000]) for i in range(0, len(ids), 1000))
+            QuantizedStore.build(path, pages, len(ids), dtype)
+            store = QuantizedStore.load(path) # fresh mappings, nothing paged in yet
+            size = int(store.vectors.nbytes + (store.scales.nbytes if store.scales is not None else 0))
+            search = lambda query, n: [chunk_id for chunk_id, _ in store.search(query, n)[0]]
+            # re-rank the way RAGbot does: float32 rows read from the store's memmap, not from chroma
+            store_rerank = lambda query, candidates: [chunk_id for chunk_id, _ in exact_rerank(
+                query, list(store.exact_vectors(candidates).items()), k)]
+            record(f"{dtype} brute force", lambda query: search(query, k), {"bytes": size})
+            record(f"{dtype} + rerank", lambda query: store_rerank(query, search(query, fetch)),
+                   {"bytes": size, "float32_bytes": int(store.exact.nbytes)})
+            del store, search, store_rerank # release the memmaps before the folder is removed
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import os
+import sys
+import atexit
+import shutil
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import platform
+import subprocess
+import tempfile
+
+import numpy as np
+import config
+
+# end to end benchmark of the bot: writes a synthetic pdf corpus, ingests it with Create_db and
+# runs queries through RAGbot against a stub llm, everything inside a scratch folder.
+# results are json, so two commits can be compared:
+#   python benchmark.py --out before.json
+#   python benchmark.py --compare before.json      # exits with 1 if something got slower
+# --embedder hash (default) swaps the model for a cheap hashing embedder, which measures the
+# pipeline itself and runs anywhere. --embedder model uses the real EMBED_BACKEND
+
+WORDS = ["money", "saving", "compounding", "risk", "luck", "wealth", "investor", "time", "market",
+         "behaviour", "freedom", "years", "interest", "spend", "enough", "history", "tails", "room",
+         "error", "optimism", "pessimism", "greed", "fear", "income", "debt", "stocks", "bonds",
+         "returns", "volatility", "patience", "control", "happiness", "goals", "plan", "budget",
+         "retirement", "inflation", "housing", "education", "career", "family", "envy", "status",
+         "humility", "confidence", "independence", "crisis", "recession", "growth", "dividends"]
+ANSWER = "Stub answer: save a bit more than you think you need, and give compounding time."
+
+
+# synthetic corpus
+
+def synthetic_page(rng, chars):
+    sentences = []
+    length = 0
+    while length < chars:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def write_pdf(path, pages, line_chars=90):
+    # minimal pdf 1.4 writer (one helvetica text stream per page), good enough for pypdf to extract
+    escape = lambda text: text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages))).encode(),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(pages):
+        lines, line = [], ""
+        for word in text.split():
+            if len(line) + len(word) >= line_chars:
+                lines.append(line)
+                line = ""
+            line = f"{line} {word}" if line else word
+        lines.append(line)
+        stream = ("BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(f"({escape(l)}) Tj T*" for l in lines) + " ET").encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(folder, files, pages_per_file, chars_per_page, seed):
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    chars = 0
+    for i in range(files):
+        pages = [synthetic_page(rng, chars_per_page) for _ in range(pages_per_file)]
+        chars += sum(map(len, pages))
+        write_pdf(os.path.join(folder, f"book_{i:03d}.pdf"), pages)
+    return {"files": files, "pages": files * pages_per_file, "chars": chars}
+
+
+def synthetic_queries(count, seed):
+    rng = random.Random(seed + 1)
+    # corpus words only (plus stopwords), so most queries clear the relevance cutoffs and reach the llm
+    return [f"why {rng.choice(WORDS)} and {rng.choice(WORDS)} with {rng.choice(WORDS)}?" for _ in range(count)]
+
+
+class HashEmbeddings:
+    # bag of hashed words, 384 dims like MiniLM: deterministic and nearly free
+    dim = 384
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+# measuring
+
+def latency_stats(seconds):
+    ms = np.asarray(seconds) * 1000
+    if not len(ms):
+        return {}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"n": len(ms), "mean_ms": round(float(ms.mean()), 3), "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3)}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError: # windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # bytes on macos, kB elsewhere
+
+
+def use_workdir(workdir):
+    # every file the pipeline writes goes to workdir. must run before Create_db / RAGbot are
+    # imported, they copy these constants at import time
+    config.DB_PATH = os.path.join(workdir, "db")
+    for name in ("MANIFEST_PATH", "VERSION_PATH", "BM25_INDEX_PATH", "VECTOR_STORE_PATH", "SEMANTIC_CACHE_PATH",
+                 "METRICS_PATH", "INGEST_METRICS_PATH"):
+        setattr(config, name, os.path.join(config.DB_PATH, os.path.basename(getattr(config, name))))
+
+
+def bench_ingest(Create_db, data, workers):
+    started = time.perf_counter()
+    stats = Create_db.sync_chunks_inChroma(data, workers)
+    ingest_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    Create_db.build_lexical_index()
+    index_seconds = time.perf_counter() - started
+    return stats, ingest_seconds, index_seconds
+
+
+def bench_queries(RAGbot, queries, concurrency):
+    results = {}
+
+    cold = [] # one at a time, every query new to the caches
+    for query in queries:
+        started = time.perf_counter()
+        RAGbot.main(query)
+        cold.append(time.perf_counter() - started)
+    results["sequential"] = latency_stats(cold)
+
+    cached = [] # the same questions again, answered from the answer cache
+    for query in queries:
+        started = time.perf_counter()
+        RAGbot.main(query)
+        cached.append(time.perf_counter() - started)
+    results["cached"] = latency_stats(cached)
+
+    async def run_concurrent():
+        # fresh questions, `concurrency` in flight at once through the micro batchers
+        gate = asyncio.Semaphore(concurrency)
+        seconds = []
+
+        async def one(query):
+            async with gate:
+                started = time.perf_counter()
+                await RAGbot.amain(query)
+                seconds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(f"{query} (again, in other words)") for query in queries))
+        return seconds, time.perf_counter() - started
+
+    seconds, wall = asyncio.run(run_concurrent())
+    results["concurrent"] = dict(latency_stats(seconds), concurrency=concurrency,
+                                 queries_per_s=round(len(queries) / wall, 1))
+    return results
+
+
+# comparing two runs: (path in the report, True if higher is better)
+TRACKED = [(("ingest", "pages_per_s"), True), (("ingest", "chunks_per_s"), True),
+           (("queries", "sequential", "p50_ms"), False), (("queries", "sequential", "p95_ms"), False),
+           (("queries", "cached", "p50_ms"), False), (("queries", "concurrent", "p95_ms"), False),
+           (("queries", "concurrent", "queries_per_s"), True), (("peak_rss_mb",), False)]
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    # relative change beyond tolerance, latencies must also have moved by min_delta_ms (timer noise)
+    regressions = []
+    for path, higher_is_better in TRACKED:
+        new, old = report, baseline
+        for key in path:
+            new = new.get(key) if isinstance(new, dict) else None
+            old = old.get(key) if isinstance(old, dict) else None
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        if path[-1].endswith("_ms") and abs(new - old) < min_delta_ms:
+            continue
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append({"metric": ".".join(path), "baseline": old, "current": new, "change": round(change, 3)})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ingestion throughput and query latency on a synthetic corpus")
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50, help="pages per pdf")
+    parser.add_argument("--chars", type=int, default=2500, help="characters per page")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=config.LOAD_WORKERS, help="pdf parsing processes")
+    parser.add_argument("--embedder", choices=["hash", "model"], default="hash")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep corpus and db here instead of a temporary folder")
+    parser.add_argument("--out", help="write the report to this json file")
+    parser.add_argument("--compare", help="baseline report, exit with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown for --compare")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="latency changes below this are noise")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="moneybot_bench_")
+    if not args.workdir:
+        # registered before RAGbot's own exit handlers (cache/metrics saves), so it runs after them
+        atexit.register(shutil.rmtree, workdir, True)
+    use_workdir(workdir)
+    if args.embedder == "hash":
+        config.set_embed_model(HashEmbeddings())
+    from langchain_core.language_models import FakeListChatModel
+    config.set_llm(FakeListChatModel(responses=[ANSWER]))
+
+    import Create_db # imported only now, see use_workdir
+    import RAGbot
+    import metrics
+    metrics.enable() # after the imports, they set it from METRICS_ENABLED
+
+    data = os.path.join(workdir, "data")
+    started = time.perf_counter()
+    corpus = make_corpus(data, args.files, args.pages, args.chars, args.seed)
+    corpus["generate_s"] = round(time.perf_counter() - started, 3)
+    rss_before = peak_rss_mb()
+
+    stats, ingest_seconds, index_seconds = bench_ingest(Create_db, data, args.workers)
+    chunks = stats["added_chunks"] + stats["kept_chunks"]
+    ingest = {"seconds": round(ingest_seconds, 3), "pages_per_s": round(corpus["pages"] / ingest_seconds, 1),
+              "chunks": chunks, "chunks_per_s": round(chunks / ingest_seconds, 1),
+              "bm25_build_s": round(index_seconds, 3), "peak_rss_mb": peak_rss_mb(), "stats": stats}
+
+    queries = synthetic_queries(args.queries, args.seed)
+    query_results = bench_queries(RAGbot, queries, args.concurrency)
+
+    stages = {stage: {"count": entry["count"], "p50_ms": round(entry["p50"] * 1000, 3),
+                      "p95_ms": round(entry["p95"] * 1000, 3), "p99_ms": round(entry["p99"] * 1000, 3)}
+              for stage, entry in metrics.snapshot()["stages"].items()}
+    report = {
+        "commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+        "machine": platform.machine(), "cpus": os.cpu_count(), "embedder": args.embedder,
+        "settings": {"chunker": config.CHUNKER, "vector_store": config.VECTOR_STORE, "hybrid": config.HYBRID_SEARCH,
+                     "embed_batch_size": config.EMBED_BATCH_SIZE, "workers": args.workers},
+        "corpus": corpus, "ingest": ingest, "queries": query_results, "stages": stages,
+        "caches": RAGbot.cache_stats(), "peak_rss_before_ingest_mb": rss_before, "peak_rss_mb": peak_rss_mb(),
+    }
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small thread safe LRU cache where entries also expire `ttl` seconds after being stored.
+    maxsize=0 turns the cache off (get always misses, set does nothing).
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict() # key -> (expires_at, value), oldest used first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key] # expired
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False) # drop least recently used
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+class SemanticCache:
+    """
+    Answer cache for paraphrased questions. Stores the embedding of every answered query
+    in one numpy matrix, a lookup is a single matrix-vector product: if the closest stored
+    query is at least `threshold` cosine similar (and from the same collection version)
+    its answer is reused. When full, the least recently used entry is replaced.
+    """
+    def __init__(self, maxsize, threshold, ttl, path=None):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.path = path # saved to <path>.npz (vectors) and <path>.json (answers)
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None # (maxsize, dim) float32, rows are unit length
+        self._count = 0
+        self._expires = np.zeros(maxsize, dtype=np.float64) # wall clock, survives restarts
+        self._last_used = np.zeros(maxsize, dtype=np.float64)
+        self._entries = [None] * maxsize # {"query", "answer", "version"}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, version):
+        if self.maxsize <= 0:
+            return None
+        query = self._unit(embedding)
+        with self._lock:
+            if self._count == 0:
+                self.misses += 1
+                return None
+            similarity = self._vectors[:self._count] @ query
+            now = time.time()
+            similarity[self._expires[:self._count] < now] = -1.0
+            version = str(version)
+            for i in np.flatnonzero(similarity >= self.threshold): # usually zero or one candidates
+                if self._entries[i]["version"] != version:
+                    similarity[i] = -1.0
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            return self._entries[best]["answer"]
+
+    def set(self, embedding, answer, version, query=""):
+        if self.maxsize <= 0:
+            return
+        vector = self._unit(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            if self._count < self.maxsize:
+                slot = self._count
+                self._count += 1
+            else:
+                slot = int(np.argmin(self._last_used)) # evict least recently used
+            now = time.time()
+            self._vectors[slot] = vector
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._entries[slot] = {"query": query, "answer": answer, "version": str(version)}
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": self._count, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def save(self):
+        if not self.path or self._count == 0:
+            return
+        with self._lock:
+            n = self._count
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.npz.tmp", "wb") as f:
+                np.savez(f, vectors=self._vectors[:n], expires=self._expires[:n], last_used=self._last_used[:n])
+            with open(f"{self.path}.json.tmp", "w", encoding="utf-8") as f:
+                json.dump(self._entries[:n], f)
+            os.replace(f"{self.path}.npz.tmp", f"{self.path}.npz")
+            os.replace(f"{self.path}.json.tmp", f"{self.path}.json")
+
+    def load(self):
+        if not self.path or not os.path.exists(f"{self.path}.npz") or not os.path.exists(f"{self.path}.json"):
+            return 0
+        try:
+            with np.load(f"{self.path}.npz") as data:
+                vectors, expires, last_used = data["vectors"], data["expires"], data["last_used"]
+            with open(f"{self.path}.json", "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except Exception as e: # a broken cache file only costs us the warm cache
+            print(f"could not load semantic cache: {e}")
+            return 0
+        if len(entries) != len(vectors):
+            return 0
+
+        keep = np.argsort(-last_used)[:self.maxsize] # most recently used first if maxsize shrank
+        with self._lock:
+            self._vectors = np.zeros((self.maxsize, vectors.shape[1]), dtype=np.float32)
+            self._count = len(keep)
+            self._vectors[:self._count] = vectors[keep]
+            self._expires[:self._count] = expires[keep]
+            self._last_used[:self._count] = last_used[keep]
+            self._entries[:self._count] = [entries[i] for i in keep]
+        return self._count
@@ -0,0 +1,86 @@
+import sys
+import json
+import time
+import argparse
+
+from config import load_embed_model, get_collection
+from vector_store import unit_rows
+
+# parity check for the embedding backends: embeds the same texts with the torch model and the
+# onnx ones, reports the cosine agreement with torch and the speed of each. exits with 1 when a
+# backend falls below --min-cosine, so it can gate switching EMBED_BACKEND on a new machine
+#   python check_embeddings.py                     # texts = chunks from the collection
+#   python check_embeddings.py --texts texts.txt --out parity.json
+
+MIN_COSINE = 0.98 # lowest cosine similarity with torch a backend may have on any text
+
+SAMPLE_TEXTS = [
+    "How do I stop comparing my spending to other people?",
+    "Compounding works best when you leave it alone for decades.",
+    "What does the author say about luck and risk?",
+    "Saving money does not need a goal.",
+    "Why is getting wealthy different from staying wealthy?",
+    "Tails drive everything: a few events account for most outcomes.",
+    "room for error",
+    "Warren Buffett",
+]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cosine agreement and speed of the embedding backends")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"])
+    parser.add_argument("--texts", help="text file, one text per line (default: chunks from the collection)")
+    parser.add_argument("--limit", type=int, default=256, help="texts taken from the collection")
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE)
+    parser.add_argument("--out", help="also write the report to this json file")
+    args = parser.parse_args()
+
+    if args.texts:
+        with open(args.texts, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = get_collection().get(limit=args.limit, include=["documents"])["documents"] or SAMPLE_TEXTS
+    queries = SAMPLE_TEXTS
+
+    report = {"texts": len(texts), "min_cosine": args.min_cosine, "backends": {}}
+    reference = None
+    failed = False
+    for backend in ["torch"] + args.backends:
+        model, load_seconds = timed(load_embed_model, backend)
+        model.embed_query("warm up") # first call allocates, keep it out of the timings
+        documents, doc_seconds = timed(model.embed_documents, texts)
+        started = time.perf_counter()
+        for query in queries:
+            model.embed_query(query)
+        query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        vectors = unit_rows(documents)
+        entry = {"dim": int(vectors.shape[1]), "load_s": round(load_seconds, 3),
+                 "docs_per_s": round(len(texts) / doc_seconds, 1), "query_ms": round(query_ms, 2)}
+        if reference is None:
+            reference = vectors
+        elif vectors.shape != reference.shape:
+            entry["error"] = f"dimension {vectors.shape[1]} does not match torch ({reference.shape[1]})"
+            failed = True
+        else:
+            cosine = (vectors * reference).sum(axis=1)
+            entry.update({"cosine_min": round(float(cosine.min()), 5), "cosine_mean": round(float(cosine.mean()), 5)})
+            failed = failed or cosine.min() < args.min_cosine
+        report["backends"][backend] = entry
+        del model
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
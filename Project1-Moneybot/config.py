@@ -1,30 +1,276 @@
-    import chromadb
-import torch
+import time
+_import_started = time.perf_counter()
+
 import os
+import threading
 from datetime import datetime
 from dotenv import load_dotenv # to load .env file
-from langchain_huggingface import HuggingFaceEmbeddings
 
+# torch (or onnxruntime), the embedding model and chroma are NOT loaded here, importing config is cheap.
+# they are created on first use by get_embed_model() / get_collection() and shared by the whole process
+
+# where the source pdfs and the local vector db live
+DATA_PATH = "Data/Money"
+DB_PATH = "psycheMoney_db"
+# per source file hashes and chunk ids, lets Create_db only re-embed what changed
+MANIFEST_PATH = os.path.join(DB_PATH, "ingest_manifest.json")
+# rewritten by Create_db after every change to the collection or to an index built from it
+VERSION_PATH = os.path.join(DB_PATH, "db_version")
+
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+COLLECTION_NAME = "money_publication"
+
+# "torch": HuggingFaceEmbeddings on torch (cuda/mps when available).
+# "onnx" / "onnx-int8": the same model on onnxruntime, full precision or dynamically quantized int8.
+# cpu only and no torch import, files are downloaded once into ONNX_MODEL_DIR (check_embeddings.py compares them)
+EMBED_BACKEND = "torch"
+ONNX_MODEL_DIR = os.path.join("models", "all-MiniLM-L6-v2")
+EMBED_THREADS = 0  # onnxruntime threads, 0 = one per core
+
+# ingestion runs as a stream: chunks are embedded and added EMBED_BATCH_SIZE at a time,
+# pdf parsing may run at most PREFETCH_BATCHES batches ahead of the embedder
+EMBED_BATCH_SIZE = 64
+PREFETCH_BATCHES = 4
+# processes used to parse and clean pdfs, 1 parses in the main process
+LOAD_WORKERS = 1
+# chunking: every page is cleaned once and cut into CHUNK_SIZE char chunks sharing CHUNK_OVERLAP chars,
+# PAGE_BATCH_SIZE pages at a time. "compat" gives exactly the chunks (and chunk ids) of the old
+# RecursiveCharacterTextSplitter pipeline (and is a little slower than it), "native" cuts the cleaned
+# page directly and is 1.5-2.5x faster than both (see bench_chunking.py)
+# changing any of these re-chunks every pdf on the next Create_db run
+CHUNKER = "compat"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+PAGE_BATCH_SIZE = 16
+
+# retrieval: TOP_K chunks go to the llm, a chunk is used if its cosine similarity is above
+# SIMILARITY_CUTOFF or (hybrid search) it contains at least KEYWORD_MATCH_CUTOFF of the distinct query keywords
+# (stopwords left out, see lexical.BM25Index.search)
+TOP_K = 5
+SIMILARITY_CUTOFF = 0.4
+# hybrid search: bm25 keyword search and dense search each return HYBRID_CANDIDATES chunks,
+# merged with reciprocal rank fusion. the bm25 index is built by Create_db next to the db
+HYBRID_SEARCH = True
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+KEYWORD_MATCH_CUTOFF = 0.5
+BM25_INDEX_PATH = os.path.join(DB_PATH, "bm25_index")
+# dense search backend: "chroma" uses chroma's hnsw index directly. "int8" or "float16" makes
+# Create_db also write a compact memory-mapped copy of the embeddings; collections up to
+# BRUTE_FORCE_LIMIT chunks are then scanned exactly with numpy, larger ones over-fetch from chroma.
+# either way RERANK_OVERFETCH x the needed candidates are re-ranked with the exact float embeddings,
+# read from a float32 memmap next to the compact copy (vectors.float.npy) instead of from chroma
+VECTOR_STORE = "chroma"
+VECTOR_STORE_PATH = os.path.join(DB_PATH, "vectors")
+BRUTE_FORCE_LIMIT = 50000
+RERANK_OVERFETCH = 4
+
+# overlapping chunks are merged before they go to the llm, and the whole context is kept under this many tokens
+CONTEXT_TOKEN_BUDGET = 1500
+
+# load the model and open the db before the bot starts serving, so the first user does not pay for it
+WARM_UP_ON_START = True
+
+# RAGbot caches, sizes are number of entries (0 turns a cache off) and ttls are in seconds
+QUERY_CACHE_SIZE = 1024  # query text -> query embedding
+QUERY_CACHE_TTL = 24 * 3600
+ANSWER_CACHE_SIZE = 256  # query text + collection version -> final answer
+ANSWER_CACHE_TTL = 3600
+# paraphrased questions: answers are reused when the new query embedding is at least
+# SEMANTIC_CACHE_THRESHOLD cosine similar to a cached one. kept on disk next to the db
+SEMANTIC_CACHE_SIZE = 512
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_TTL = 24 * 3600
+SEMANTIC_CACHE_PATH = os.path.join(DB_PATH, "semantic_cache")
+SEMANTIC_CACHE_SAVE_EVERY = 20  # new answers between saves (it is also saved on exit)
+
+# for llm response
+load_dotenv()  # loads .env fileX
+api_key = os.getenv("GROQ_API_KEY") # fetch api key from .env
+LLM_MODEL = "llama-3.1-8b-instant"
+
+# serving: the gradio app calls the async amain, up to SERVE_CONCURRENCY requests at once.
+# concurrent queries arriving within BATCH_WINDOW_MS are embedded and searched together
+SERVE_ASYNC = True
+STREAM_ANSWERS = True  # show the answer token by token instead of waiting for all of it
+SERVE_CONCURRENCY = 32
+BATCH_WINDOW_MS = 5
+MAX_QUERY_BATCH = 32
 
-device = (
+
+# per stage latency histograms (p50/p95/p99) and counters, see metrics.py. off by default, the hooks cost
+# next to nothing then. written in prometheus text format to METRICS_PATH (bot) / INGEST_METRICS_PATH
+# (Create_db), and served on http://METRICS_HOST:METRICS_PORT/metrics by the bot if METRICS_PORT is set
+METRICS_ENABLED = False
+METRICS_PATH = os.path.join(DB_PATH, "metrics.prom")
+INGEST_METRICS_PATH = os.path.join(DB_PATH, "ingest_metrics.prom")
+METRICS_DUMP_INTERVAL = 60  # seconds between rewrites of METRICS_PATH while the bot runs
+METRICS_PORT = 0  # 0 = no http endpoint
+METRICS_HOST = "127.0.0.1"
+
+# seconds spent in each startup stage, filled in as things get loaded (see startup_report)
+startup_timings = {}
+
+_embed_lock = threading.Lock()
+_db_lock = threading.Lock()
+_llm_lock = threading.Lock()
+_embed_model = None
+_client = None
+_collection = None
+_llm = None
+
+
+def _timed(stage, started):
+    startup_timings[stage] = startup_timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def get_device():
+    started = time.perf_counter()
+    import torch
+    _timed("import torch", started)
+
+    return (
         "cuda"
         if torch.cuda.is_available()
         else "mps" if torch.backends.mps.is_available() else "cpu"
     )
 
-# embeddings will be used as keys in vector database
-embed_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={"device": device},
-)
 
-#Chroma only sees strings + dicts, not fancy objects.
-client = chromadb.PersistentClient(path="psycheMoney_db") # storing db in local file not on a seperate server or as a separate process
-collection = client.get_or_create_collection(# only creates if db dosen't exists
-    name="money_publication",
-    metadata={"hnsw:space": "cosine", "created": str(datetime.now())} # uses cosine similarity to cal distance(alt: l2(euclidean))
-)
+def load_embed_model(backend):
+    # builds a new model for the given EMBED_BACKEND, get_embed_model() keeps the shared one
+    if backend in ("onnx", "onnx-int8"):
+        started = time.perf_counter()
+        from embeddings import OnnxEmbeddings
+        _timed("import embeddings", started)
 
-# for llm response
-load_dotenv()  # loads .env fileX
-api_key = os.getenv("GROQ_API_KEY") # fetch api key from .env
\ No newline at end of file
+        started = time.perf_counter()
+        model = OnnxEmbeddings(EMBED_MODEL_NAME, ONNX_MODEL_DIR, quantized=backend == "onnx-int8", threads=EMBED_THREADS)
+        _timed("model load", started)
+        return model
+    if backend != "torch":
+        raise ValueError(f"unknown EMBED_BACKEND {backend!r}, use 'torch', 'onnx' or 'onnx-int8'")
+
+    device = get_device()
+
+    started = time.perf_counter()
+    from langchain_huggingface import HuggingFaceEmbeddings
+    _timed("import embeddings", started)
+
+    started = time.perf_counter()
+    # embeddings will be used as keys in vector database
+    model = HuggingFaceEmbeddings(
+        model_name=EMBED_MODEL_NAME,
+        model_kwargs={"device": device},
+    )
+    _timed("model load", started)
+    return model
+
+
+def get_embed_model():
+    global _embed_model
+    if _embed_model is None:
+        with _embed_lock:
+            if _embed_model is None: # another thread may have loaded it while we waited
+                _embed_model = load_embed_model(EMBED_BACKEND)
+    return _embed_model
+
+
+def set_embed_model(model):
+    # swap in any object with embed_documents / embed_query, e.g. a cheap stand-in for benchmarks
+    global _embed_model
+    _embed_model = model
+
+
+def get_collection():
+    global _client, _collection
+    if _collection is None:
+        with _db_lock:
+            if _collection is None:
+                started = time.perf_counter()
+                import chromadb
+                _timed("import chromadb", started)
+
+                started = time.perf_counter()
+                #Chroma only sees strings + dicts, not fancy objects.
+                _client = chromadb.PersistentClient(path=DB_PATH) # storing db in local file not on a seperate server or as a separate process
+                _collection = _client.get_or_create_collection(# only creates if db dosen't exists
+                    name=COLLECTION_NAME,
+                    metadata={"hnsw:space": "cosine", "created": str(datetime.now())} # uses cosine similarity to cal distance(alt: l2(euclidean))
+                )
+                _timed("db open", started)
+    return _collection
+
+
+def get_llm():
+    # one long lived client, it keeps its http connections open between requests
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_groq import ChatGroq
+                _llm = ChatGroq(model=LLM_MODEL, temperature=0)
+    return _llm
+
+
+def set_llm(llm):
+    # swap in any langchain chat model, e.g. a local stub (langchain_core's FakeListChatModel) for tests
+    global _llm
+    _llm = llm
+
+
+def bump_collection_version():
+    # called by Create_db once the collection or an index is fully rewritten, answers cached
+    # in the meantime are keyed on the old version and dropped from here on
+    os.makedirs(os.path.dirname(VERSION_PATH) or ".", exist_ok=True)
+    with open(f"{VERSION_PATH}.tmp", "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
+    os.replace(f"{VERSION_PATH}.tmp", VERSION_PATH)
+
+
+def collection_version():
+    # the stamp written by bump_collection_version, one small read, cheap enough to do per query.
+    # databases built before the stamp existed fall back to the manifest's mtime/size
+    try:
+        with open(VERSION_PATH, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        pass
+    try:
+        stat = os.stat(MANIFEST_PATH)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def warm_up():
+    # loads everything up front and runs one dummy query through the model (first call is always slow)
+    get_embed_model()
+    get_collection()
+    started = time.perf_counter()
+    get_embed_model().embed_query("warm up")
+    get_collection().count()
+    _timed("warm up", started)
+
+
+def startup_report():
+    total = sum(startup_timings.values())
+    print("startup timings:")
+    for stage, seconds in startup_timings.items():
+        print(f"  {stage:<18} {seconds * 1000:9.1f} ms")
+    print(f"  {'total':<18} {total * 1000:9.1f} ms")
+    return dict(startup_timings)
+
+
+def __getattr__(name):
+    # old code did `from config import embed_model, collection`, keep that working (lazily)
+    if name == "embed_model":
+        return get_embed_model()
+    if name == "collection":
+        return get_collection()
+    if name == "client":
+        get_collection()
+        return _client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_timed("import config", _import_started)
@@ -0,0 +1,127 @@
+import re
+
+# context assembly: retrieved chunks overlap (chunk_overlap=200) and neighbouring hits often
+# come from the same passage. chunks of the same title that overlap are stitched back into one
+# passage, chunks fully contained in another are dropped, and the result is packed into a token budget
+
+MIN_OVERLAP = 30 # characters a suffix/prefix must share before two chunks count as neighbours
+SENTENCE_END_RE = re.compile(r"[.!?]\s")
+
+
+def count_tokens(text):
+    # rough llama/gpt style estimate (~4 characters per token), good enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def overlap(left, right):
+    # length of the longest suffix of `left` that is also a prefix of `right` (0 if below MIN_OVERLAP)
+    probe = right[:MIN_OVERLAP]
+    if len(probe) < MIN_OVERLAP:
+        return 0
+    start = left.find(probe, max(0, len(left) - len(right)))
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+def merge_chunks(chunks):
+    """
+    chunks: retrieved chunks best first ({"title", "content", ...}).
+    Returns passages [{"title", "content", "rank"}] where rank is the best rank of the
+    chunks merged into it, so the best material still comes first.
+    """
+    passages = []
+    for rank, chunk in enumerate(chunks):
+        text = chunk["content"]
+        merged = False
+        for passage in passages:
+            if passage["title"] != chunk["title"]:
+                continue
+            if text in passage["content"]: # duplicate span, nothing new
+                merged = True
+            else:
+                after = overlap(passage["content"], text)
+                before = 0 if after else overlap(text, passage["content"])
+                if after:
+                    passage["content"] += text[after:]
+                    merged = True
+                elif before:
+                    passage["content"] = text + passage["content"][before:]
+                    merged = True
+                elif passage["content"] in text:
+                    passage["content"] = text
+                    merged = True
+            if merged:
+                break
+        if not merged:
+            passages.append({"title": chunk["title"], "content": text, "rank": rank})
+
+    # a merge can make two passages touch each other, join those as well
+    joined = True
+    while joined:
+        joined = False
+        for i, first in enumerate(passages):
+            for second in passages[i + 1:]:
+                if first["title"] != second["title"]:
+                    continue
+                after = overlap(first["content"], second["content"])
+                before = 0 if after else overlap(second["content"], first["content"])
+                if after:
+                    first["content"] += second["content"][after:]
+                elif before:
+                    first["content"] = second["content"] + first["content"][before:]
+                else:
+                    continue
+                first["rank"] = min(first["rank"], second["rank"])
+                passages.remove(second)
+                joined = True
+                break
+            if joined:
+                break
+    return sorted(passages, key=lambda passage: passage["rank"])
+
+
+def truncate_to_tokens(text, max_tokens):
+    # cut at the last sentence end that fits, or at a word boundary if there is none
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    ends = [m.end() for m in SENTENCE_END_RE.finditer(cut)]
+    if ends:
+        return cut[:ends[-1]].strip()
+    return cut.rsplit(" ", 1)[0]
+
+
+def pack_context(chunks, token_budget, min_tokens=50):
+    """
+    Merges overlapping chunks and packs passages into token_budget, best first. A passage
+    that does not fit is cut at a sentence end if at least min_tokens are left.
+    Returns (context, stats) with stats = chunks/passages used and the tokens saved
+    compared to joining every chunk as is.
+    """
+    format_passage = lambda title, content: f"From {title}:\n{content}"
+    naive = "\n\n".join(format_passage(chunk["title"], chunk["content"]) for chunk in chunks)
+
+    parts = []
+    used = 0
+    for passage in merge_chunks(chunks):
+        part = format_passage(passage["title"], passage["content"])
+        tokens = count_tokens(part) + (1 if parts else 0)
+        if used + tokens > token_budget:
+            left = token_budget - used - count_tokens(format_passage(passage["title"], ""))
+            if left < min_tokens:
+                continue
+            part = format_passage(passage["title"], truncate_to_tokens(passage["content"], left))
+            tokens = count_tokens(part) + (1 if parts else 0)
+        parts.append(part)
+        used += tokens
+
+    context = "\n\n".join(parts)
+    tokens_before = count_tokens(naive) if chunks else 0
+    tokens_after = count_tokens(context) if parts else 0
+    stats = {"chunks": len(chunks), "passages": len(parts), "tokens_before": tokens_before,
+             "tokens_after": tokens_after, "tokens_saved": tokens_before - tokens_after}
+    return context, stats
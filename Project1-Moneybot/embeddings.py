@@ -0,0 +1,79 @@
+import os
+import platform
+import numpy as np
+
+# torch free embedding backend: all-MiniLM-L6-v2 exported to onnx, run with onnxruntime and the
+# fast rust tokenizer (both already come with chromadb). same 384 dim, mean pooled and unit length
+# vectors as the sentence-transformers model, so it can query a collection embedded with torch.
+# the onnx files are the ones published in the model's hub repo, downloaded once into ONNX_MODEL_DIR
+
+MAX_SEQ_LENGTH = 256 # sentence-transformers truncates MiniLM inputs at 256 tokens
+BATCH_SIZE = 32
+
+
+def onnx_file(quantized):
+    # hub file name of the model, the int8 variants are dynamically quantized per cpu family
+    if not quantized:
+        return "onnx/model.onnx"
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def fetch(model_name, filename, folder):
+    # local copy first, so a replica without internet works once the folder is shipped
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        from huggingface_hub import hf_hub_download
+        path = hf_hub_download(repo_id=model_name, filename=filename, local_dir=folder)
+    return path
+
+
+class OnnxEmbeddings:
+    """
+    Drop in replacement for langchain's HuggingFaceEmbeddings (embed_documents / embed_query).
+    quantized=True loads the int8 model: roughly a quarter of the size and faster on cpu,
+    at a small cost in cosine agreement (see check_embeddings.py).
+    """
+    def __init__(self, model_name, folder, quantized=False, threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(fetch(model_name, "tokenizer.json", folder))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(fetch(model_name, onnx_file(quantized), folder), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _embed(self, texts):
+        encoded = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask,
+                  "token_type_ids": np.zeros_like(input_ids)}
+        tokens = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+        # mean pooling over the real tokens, then unit length (what the sentence-transformers pipeline does)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        # similar lengths go in the same batch so little time is spent on padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), BATCH_SIZE):
+            batch = order[start:start + BATCH_SIZE]
+            for i, vector in zip(batch, self._embed([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
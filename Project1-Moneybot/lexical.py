@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import numpy as np
+
+# keyword side of hybrid search: a BM25 inverted index over the chunks in chroma.
+# postings are stored CSR style in flat numpy arrays (term t owns postings[offsets[t]:offsets[t+1]])
+# so a query is a handful of vectorised array updates, no python loop over documents
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "do", "for", "from", "how", "i",
+    "if", "in", "into", "is", "it", "its", "me", "my", "of", "on", "or", "so", "that", "the",
+    "their", "them", "then", "there", "these", "they", "this", "to", "was", "we", "what",
+    "when", "which", "who", "why", "will", "with", "you", "your",
+}
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, ids, terms, offsets, postings, term_freqs, doc_lens, k1=1.5, b=0.75):
+        self.ids = ids # chunk id of every document row
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets # int64, len(terms) + 1
+        self.postings = postings # int32 document rows
+        self.term_freqs = term_freqs # float32, same length as postings
+        self.doc_lens = doc_lens # float32 tokens per document
+        self.k1 = k1
+        self.b = b
+        n = len(ids)
+        avg_len = float(doc_lens.mean()) if n else 0.0
+        # the per document part of the bm25 denominator, computed once
+        # avg_len is 0 when every chunk is stopwords only, keep the ratio finite
+        self._doc_norm = (k1 * (1 - b + b * doc_lens / (avg_len or 1.0))).astype(np.float32) if n else doc_lens
+        df = np.diff(offsets).astype(np.float64)
+        self._idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    @classmethod
+    def build(cls, docs):
+        # docs: iterable of (chunk_id, text), consumed once so it can be a paged generator
+        ids, doc_lens = [], []
+        term_postings = {} # term -> ([doc rows], [term freqs])
+        for row, (chunk_id, text) in enumerate(docs):
+            ids.append(chunk_id)
+            counts = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            doc_lens.append(len(tokens))
+            for token, count in counts.items():
+                rows, freqs = term_postings.setdefault(token, ([], []))
+                rows.append(row)
+                freqs.append(count)
+
+        terms = sorted(term_postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(term_postings[t][0]) for t in terms])
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        term_freqs = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            rows, freqs = term_postings.pop(term)
+            postings[offsets[i]:offsets[i + 1]] = rows
+            term_freqs[offsets[i]:offsets[i + 1]] = freqs
+        return cls(ids, terms, offsets, postings, term_freqs, np.asarray(doc_lens, dtype=np.float32))
+
+    def search(self, query, top_k):
+        """
+        Returns [(chunk_id, score, coverage)] best first. coverage is the share of the distinct
+        query keywords (stopwords left out) the chunk contains, so it can be used as a cutoff
+        no matter how long the query is; a keyword no chunk contains still counts as missed.
+        """
+        tokens = set(tokenize(query))
+        if not tokens or not self.ids:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = np.zeros(len(self.ids), dtype=np.int32) # query keywords found in each chunk
+        for token in tokens:
+            t = self.terms.get(token)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            rows = self.postings[start:end]
+            tf = self.term_freqs[start:end]
+            scores[rows] += self._idf[t] * tf * (self.k1 + 1) / (tf + self._doc_norm[rows])
+            matched[rows] += 1
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(self.ids[i], float(scores[i]), int(matched[i]) / len(tokens)) for i in hits]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        terms = sorted(self.terms, key=self.terms.get)
+        with open(f"{path}.npz.tmp", "wb") as f:
+            np.savez(f, offsets=self.offsets, postings=self.postings, term_freqs=self.term_freqs, doc_lens=self.doc_lens)
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "terms": terms, "k1": self.k1, "b": self.b}, f)
+        os.replace(f"{path}.npz.tmp", f"{path}.npz")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(f"{path}.npz") or not os.path.exists(f"{path}.json"):
+            return None
+        with np.load(f"{path}.npz") as data:
+            arrays = {name: data[name] for name in ("offsets", "postings", "term_freqs", "doc_lens")}
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta["ids"], meta["terms"], k1=meta["k1"], b=meta["b"], **arrays)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    # rankings: lists of ids, best first. returns ids ordered by sum of 1 / (k + rank)
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,191 @@
+import os
+import time
+import threading
+import numpy as np
+
+# per stage latency histograms and counters for the bot and for ingestion, exported in the
+# prometheus text format (dump file and/or a tiny http endpoint).
+#   with metrics.timer("chroma_query"): ...    # records the seconds spent in the block
+#   metrics.count("answer_cache_hits")
+# while disabled timer() hands back one shared do-nothing context manager and count() returns
+# straight away, so the hooks can stay in the hot paths
+
+SAMPLES = 2048 # latest observations kept per stage for the p50/p95/p99 quantiles
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "moneybot_"
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {} # stage -> Histogram
+_counters = {} # name -> float
+_hooks = [] # fn(stage, seconds), called for every observation
+
+
+class Histogram:
+    # sum/count over all time, quantiles over the last SAMPLES observations (ring buffer)
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = np.zeros(SAMPLES, dtype=np.float64)
+
+    def observe(self, seconds):
+        self.samples[self.count % SAMPLES] = seconds
+        self.count += 1
+        self.sum += seconds
+
+    def quantiles(self):
+        recent = self.samples[:min(self.count, SAMPLES)]
+        if not len(recent):
+            return {q: 0.0 for q in QUANTILES}
+        return dict(zip(QUANTILES, np.quantile(recent, QUANTILES).tolist()))
+
+
+class _Timer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+def add_hook(fn):
+    # e.g. forward every observation to a tracer: add_hook(lambda stage, seconds: ...)
+    _hooks.append(fn)
+
+
+def timer(stage):
+    return _Timer(stage) if _enabled else _NO_TIMER
+
+
+def observe(stage, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+    for hook in _hooks:
+        hook(stage, seconds)
+
+
+def count(name, value=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def timed_iter(stage, iterable):
+    # times every next() of a generator stage (e.g. pdf pages), the consumer's time is not included
+    if not _enabled:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        observe(stage, time.perf_counter() - started)
+        yield item
+
+
+def snapshot():
+    # {"stages": {stage: {count, sum, p50, p95, p99}}, "counters": {...}}, seconds throughout
+    with _lock:
+        stages = {}
+        for stage, histogram in _histograms.items():
+            entry = {"count": histogram.count, "sum": histogram.sum}
+            entry.update({f"p{round(q * 100)}": value for q, value in histogram.quantiles().items()})
+            stages[stage] = entry
+        return {"stages": stages, "counters": dict(_counters)}
+
+
+def render():
+    # prometheus text exposition format: one summary per stage, one counter per counter
+    data = snapshot()
+    lines = [f"# HELP {PREFIX}stage_seconds time spent per pipeline stage",
+             f"# TYPE {PREFIX}stage_seconds summary"]
+    for stage, entry in sorted(data["stages"].items()):
+        for q in QUANTILES:
+            lines.append(f'{PREFIX}stage_seconds{{stage="{stage}",quantile="{q}"}} {entry[f"p{round(q * 100)}"]:.6f}')
+        lines.append(f'{PREFIX}stage_seconds_sum{{stage="{stage}"}} {entry["sum"]:.6f}')
+        lines.append(f'{PREFIX}stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE {PREFIX}{name}_total counter")
+        lines.append(f"{PREFIX}{name}_total {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    if not _enabled:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(f"{path}.tmp", path)
+
+
+def dump_every(path, interval):
+    # rewrites the dump file every `interval` seconds from a daemon thread
+    def loop():
+        while True:
+            time.sleep(interval)
+            dump(path)
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def serve(port, host="127.0.0.1"):
+    # GET /metrics on a daemon thread, for prometheus to scrape
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): # no access log on stdout
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,119 @@
+from utils import clean_text, batched
+import metrics
+
+# normalise + chunk stage of ingestion. every page is cleaned once (one regex pass, see
+# utils.clean_text) and chunks are kept as (page, start, end) spans over the cleaned page,
+# so a chunk's text is only sliced out when it is hashed/embedded/stored, batch by batch.
+#   "native": spans are cut directly on the cleaned page, at a sentence end or a word boundary
+#   "compat": same chunks, byte for byte, as splitting the raw page with RecursiveCharacterTextSplitter
+#             and cleaning every chunk afterwards (what ingestion always did, keeps existing chunk ids)
+
+
+def native_spans(page, chunk_size, chunk_overlap):
+    # (start, end) spans of at most chunk_size chars, neighbours share about chunk_overlap chars
+    spans = []
+    start, n = 0, len(page)
+    while start < n:
+        end = min(start + chunk_size, n)
+        if end < n:
+            cut = page.rfind(". ", start + chunk_size // 2, end) # sentence end in the second half of the window
+            if cut != -1:
+                end = cut + 1
+            else:
+                cut = page.rfind(" ", start + 1, end + 1)
+                if cut != -1:
+                    end = cut
+        spans.append((start, end))
+        if end >= n:
+            break
+
+        # the next chunk starts chunk_overlap chars back, on the start of a word
+        next_start = max(end - chunk_overlap, start + 1)
+        if page[next_start - 1] != " ":
+            space = page.find(" ", next_start, end)
+            if space != -1:
+                next_start = space + 1
+        while next_start < n and page[next_start] == " ":
+            next_start += 1
+        start = next_start
+    return spans
+
+
+def compat_spans(raw_page, page, text_splitter):
+    # splits the raw page like before and finds every cleaned chunk in the cleaned page.
+    # cleaning only ever collapses runs into one space, so a cleaned chunk should always be a
+    # substring; one that is not (a clean_text change, an odd splitter cut) comes back as its
+    # text instead of a (start, end) span, chunk_pages then stores that text as it is
+    spans = []
+    cursor = 0
+    for chunk in text_splitter.split_text(raw_page):
+        text = clean_text(chunk)
+        if not text:
+            continue
+        start = page.find(text, cursor)
+        if start == -1:
+            start = page.find(text)
+        if start == -1:
+            metrics.count("ingest_chunk_not_found")
+            spans.append(text)
+            continue
+        spans.append((start, start + len(text)))
+        cursor = start # chunks come in page order, the next one starts at or after this one
+    return spans
+
+
+class PageBatch:
+    """
+    Cleaned pages of one batch and the chunks cut from them. Iterating yields (text, meta)
+    like the old chunk list did, meta is one dict per page shared by its chunks. A compat
+    chunk that could not be found in its cleaned page is kept as a page of its own.
+    """
+    __slots__ = ("pages", "metas", "spans")
+
+    def __init__(self):
+        self.pages = [] # cleaned page text
+        self.metas = [] # {"title", "source"} per page
+        self.spans = [] # (page index, start, end)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __iter__(self):
+        for page, start, end in self.spans:
+            yield self.pages[page][start:end], self.metas[page]
+
+
+def chunk_pages(pages, source, title, mode, chunk_size, chunk_overlap, batch_pages, text_splitter=None):
+    """
+    pages: langchain Documents (raw page text + metadata). Yields one PageBatch per
+    batch_pages pages, in order. mode is "native" or "compat" (needs text_splitter).
+    """
+    if mode not in ("native", "compat"):
+        raise ValueError(f"unknown CHUNKER {mode!r}, use 'native' or 'compat'")
+    for documents in batched(pages, batch_pages):
+        batch = PageBatch()
+        for document in documents:
+            raw = document.page_content
+            if not raw or not isinstance(raw, str):
+                continue
+            with metrics.timer("ingest_chunk"):
+                page = clean_text(raw)
+                if not page:
+                    continue
+                if mode == "native":
+                    spans = native_spans(page, chunk_size, chunk_overlap)
+                else:
+                    spans = compat_spans(raw, page, text_splitter)
+            index = len(batch.pages)
+            meta = {"title": document.metadata.get("title", title), "source": source}
+            batch.pages.append(page)
+            batch.metas.append(meta)
+            for span in spans:
+                if isinstance(span, str): # compat chunk text that is not in the cleaned page
+                    batch.pages.append(span)
+                    batch.metas.append(meta)
+                    batch.spans.append((len(batch.pages) - 1, 0, len(span)))
+                else:
+                    batch.spans.append((index, *span))
+        if batch.spans:
+            yield batch
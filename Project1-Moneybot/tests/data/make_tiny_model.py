@@ -0,0 +1,59 @@
+import os
+import numpy as np
+
+# writes the tiny stand-in for all-MiniLM-L6-v2 used by tests/test_onnx_embeddings.py: a word level
+# tokenizer, an onnx graph that only looks up one random vector per token, and the vectors the
+# sentence-transformers pipeline (mean pool over the real tokens, unit length) gives for TEXTS,
+# computed here with plain numpy. needs the onnx package, only to re-create the files:
+#   python tests/data/make_tiny_model.py
+
+FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiny_minilm")
+DIM = 8
+MAX_SEQ_LENGTH = 256 # embeddings.MAX_SEQ_LENGTH
+
+TEXTS = [
+    "How do I stop comparing my spending to other people?",
+    "Compounding works best when you leave it alone for decades.",
+    "room for error",
+    "Warren Buffett",
+    "Saving money does not need a goal.",
+    "tails drive everything",
+    " ".join(["compounding"] * 300), # longer than MAX_SEQ_LENGTH, truncated
+]
+
+
+def main():
+    from onnx import TensorProto, helper, numpy_helper, save
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+
+    words = sorted({word for text in TEXTS for word in text.lower().split()} - {"tails"}) # "tails" stays unknown
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{word: i + 2 for i, word in enumerate(words)}}
+    table = np.random.default_rng(0).normal(size=(len(vocab), DIM)).astype(np.float32)
+    table[0] = 100.0 # padding must never leak into the pooled vector
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    os.makedirs(os.path.join(FOLDER, "onnx"), exist_ok=True)
+    tokenizer.save(os.path.join(FOLDER, "tokenizer.json"))
+
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "tiny_minilm",
+        [helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+         helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "seq"])],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", DIM])],
+        [numpy_helper.from_array(table, "table")])
+    save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8),
+         os.path.join(FOLDER, "onnx", "model.onnx"))
+
+    vectors = []
+    for text in TEXTS:
+        ids = [vocab.get(word, vocab["[UNK]"]) for word in text.lower().split()][:MAX_SEQ_LENGTH]
+        pooled = table[ids].mean(axis=0)
+        vectors.append(pooled / np.linalg.norm(pooled))
+    np.savez_compressed(os.path.join(FOLDER, "reference.npz"), texts=np.array(TEXTS), vectors=np.array(vectors, dtype=np.float32))
+
+
+if __name__ == "__main__":
+    main()
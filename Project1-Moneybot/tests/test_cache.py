@@ -0,0 +1,64 @@
+import numpy as np
+
+from cache import TTLCache, SemanticCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1 # "b" is now the oldest used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_ttl_cache_expiry_and_off_switch():
+    expired = TTLCache(maxsize=4, ttl=-1)
+    expired.set("a", 1)
+    assert expired.get("a", "miss") == "miss"
+    assert len(expired) == 0 # dropped on the read
+
+    off = TTLCache(maxsize=0, ttl=60)
+    off.set("a", 1)
+    assert off.get("a") is None and len(off) == 0
+
+
+def test_semantic_cache_matches_close_queries_of_the_same_version():
+    cache = SemanticCache(maxsize=4, threshold=0.95, ttl=60)
+    cache.set([1.0, 0.0, 0.0], "answer", version="v1", query="q")
+    assert cache.get([0.99, 0.05, 0.0], "v1") == "answer" # not unit length, still matches
+    assert cache.get([0.0, 1.0, 0.0], "v1") is None # too far
+    assert cache.get([1.0, 0.0, 0.0], "v2") is None # collection changed since
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_semantic_cache_replaces_least_recently_used_when_full():
+    cache = SemanticCache(maxsize=2, threshold=0.99, ttl=60)
+    cache.set([1.0, 0.0], "x", "v")
+    cache.set([0.0, 1.0], "y", "v")
+    cache._last_used[:] = [2.0, 1.0] # "y" used longest ago
+    cache.set([-1.0, 0.0], "z", "v")
+    assert cache.get([0.0, 1.0], "v") is None
+    assert (cache.get([1.0, 0.0], "v"), cache.get([-1.0, 0.0], "v")) == ("x", "z")
+
+
+def test_semantic_cache_expired_entries_miss():
+    cache = SemanticCache(maxsize=2, threshold=0.9, ttl=-1)
+    cache.set([1.0, 0.0], "x", "v")
+    assert cache.get([1.0, 0.0], "v") is None
+
+
+def test_semantic_cache_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "semantic")
+    cache = SemanticCache(maxsize=4, threshold=0.9, ttl=60, path=path)
+    cache.set([1.0, 0.0], "x", "v", query="first")
+    cache.set([0.0, 1.0], "y", "v", query="second")
+    cache.save()
+
+    loaded = SemanticCache(maxsize=1, threshold=0.9, ttl=60, path=path)
+    assert loaded.load() == 1 # maxsize shrank, the most recently used entry is kept
+    assert loaded.get([0.0, 1.0], "v") == "y"
+    assert np.allclose(np.linalg.norm(loaded._vectors[:1], axis=1), 1.0)
+    assert SemanticCache(maxsize=4, threshold=0.9, ttl=60, path=str(tmp_path / "none")).load() == 0
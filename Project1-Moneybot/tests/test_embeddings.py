@@ -0,0 +1,31 @@
+import pytest
+
+# same check as check_embeddings.py on its sample texts: the onnx backends must embed like torch.
+# needs torch and onnxruntime plus the model files (downloaded on first use), skipped otherwise
+pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("langchain_huggingface")
+
+from config import load_embed_model
+from vector_store import unit_rows
+from check_embeddings import SAMPLE_TEXTS, MIN_COSINE
+
+
+def embed(backend):
+    try:
+        model = load_embed_model(backend)
+    except OSError as e: # offline and the model is not cached yet
+        pytest.skip(f"{backend} model not available: {e}")
+    return unit_rows(model.embed_documents(SAMPLE_TEXTS)), unit_rows([model.embed_query(text) for text in SAMPLE_TEXTS])
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return embed("torch")
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_matches_torch(reference, backend):
+    for vectors, expected in zip(embed(backend), reference):
+        assert vectors.shape == expected.shape
+        assert (vectors * expected).sum(axis=1).min() >= MIN_COSINE
@@ -0,0 +1,49 @@
+import numpy as np
+
+from lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    ("c1", "Compounding rewards patience: leave your savings alone for decades."),
+    ("c2", "Luck and risk are siblings, both shape every outcome."),
+    ("c3", "Saving money does not need a goal. Saving is a hedge."),
+]
+
+
+def test_tokenize_drops_stopwords_and_keeps_inner_punctuation():
+    assert tokenize("What is the U.S. savings rate, and why?") == ["u.s", "savings", "rate"]
+
+
+def test_search_ranks_by_bm25_and_reports_coverage():
+    index = BM25Index.build(DOCS)
+    hits = index.search("saving goal luck", 5)
+    assert [chunk_id for chunk_id, _, _ in hits] == ["c3", "c2"]
+    assert hits[0][1] > hits[1][1]
+    assert [coverage for _, _, coverage in hits] == [2 / 3, 1 / 3]
+    assert index.search("saving", 1)[0][0] == "c3"
+    assert index.search("the of and", 5) == [] # stopwords only
+    assert index.search("bitcoin", 5) == []
+
+
+def test_save_load_round_trip(tmp_path):
+    index = BM25Index.build(DOCS)
+    path = str(tmp_path / "bm25")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.ids == index.ids
+    assert loaded.search("luck risk", 3) == index.search("luck risk", 3)
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_stopword_only_chunks_keep_finite_norms():
+    index = BM25Index.build([("a", "the and of"), ("b", "it is to")])
+    assert np.isfinite(index._doc_norm).all()
+    assert index.search("budget", 5) == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    # "b" is second in both rankings and beats "a" and "c", each first in only one
+    fused = reciprocal_rank_fusion([["a", "b", "d"], ["c", "b"]])
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert fused[-1] == "d"
+    assert reciprocal_rank_fusion([]) == []
@@ -0,0 +1,43 @@
+import os
+import numpy as np
+import pytest
+
+# torch free check of the onnx backend: OnnxEmbeddings runs a tiny stand-in model (tests/data,
+# made by make_tiny_model.py) and must give the reference vectors stored next to it. covers the
+# tokenizer/session wiring, padding, truncation, mean pooling and the batch reordering
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+
+import embeddings
+from embeddings import OnnxEmbeddings
+
+FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tiny_minilm")
+
+
+@pytest.fixture(scope="module")
+def reference():
+    with np.load(os.path.join(FOLDER, "reference.npz")) as data:
+        return data["texts"].tolist(), data["vectors"]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return OnnxEmbeddings("tiny-minilm", FOLDER) # files are found locally, nothing is downloaded
+
+
+def test_documents_match_reference(model, reference, monkeypatch):
+    texts, expected = reference
+    monkeypatch.setattr(embeddings, "BATCH_SIZE", 2) # several padded batches, sorted by length
+    vectors = np.array(model.embed_documents(texts), dtype=np.float32)
+    assert vectors.shape == expected.shape
+    assert np.allclose(vectors, expected, atol=1e-5)
+
+
+def test_query_matches_reference(model, reference):
+    texts, expected = reference
+    for text, vector in zip(texts, expected):
+        assert np.allclose(model.embed_query(text), vector, atol=1e-5)
+
+
+def test_no_texts(model):
+    assert model.embed_documents([]) == []
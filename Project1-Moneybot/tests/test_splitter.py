@@ -0,0 +1,58 @@
+import pytest
+from langchain_core.documents import Document
+
+from splitter import native_spans, compat_spans, chunk_pages
+from utils import clean_text
+
+PAGE = clean_text("Saving money does not need a goal.  It is a hedge against\n\nlife's surprises. " * 12)
+
+
+def test_native_spans_cover_the_page_within_size_and_overlap():
+    spans = native_spans(PAGE, 200, 40)
+    assert spans[0][0] == 0 and spans[-1][1] == len(PAGE)
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert end - start <= 200
+        assert start < next_start <= end # neighbours overlap or touch, no gaps
+        assert PAGE[next_start] != " " and PAGE[next_start - 1] == " " # starts on a word
+    assert all(PAGE[end - 1] == "." or PAGE[end] == " " for _, end in spans[:-1]) # sentence end or word boundary
+
+
+def test_native_spans_short_page_is_one_chunk():
+    assert native_spans("one short page", 200, 40) == [(0, 14)]
+
+
+class ListSplitter:
+    # stands in for RecursiveCharacterTextSplitter, returns fixed raw chunks
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def split_text(self, text):
+        return self.chunks
+
+
+def test_compat_spans_point_at_the_cleaned_chunks():
+    raw = "Luck  and risk.\n\nBoth   shape outcomes."
+    page = clean_text(raw)
+    spans = compat_spans(raw, page, ListSplitter(["Luck  and risk.", "\n", "Both   shape outcomes."]))
+    assert [page[start:end] for start, end in spans] == ["Luck and risk.", "Both shape outcomes."]
+
+
+def test_compat_chunk_missing_from_the_page_comes_back_as_text():
+    page = clean_text("Luck and risk.")
+    assert compat_spans("Luck and risk.", page, ListSplitter(["Luck and", "tails drive"])) == [(0, 8), "tails drive"]
+
+
+def test_chunk_pages_batches_and_keeps_unfound_compat_text():
+    pages = [Document(page_content="Luck and risk.", metadata={"title": "Psychology"}),
+             Document(page_content="   "), # cleans to nothing, skipped
+             Document(page_content="Room for error.")]
+    splitter = ListSplitter(["Luck and", "tails drive"])
+    batches = list(chunk_pages(pages, "book.pdf", "Book", "compat", 200, 40, 2, splitter))
+    assert [len(batch) for batch in batches] == [2, 2]
+    first = list(batches[0])
+    assert first[0] == ("Luck and", {"title": "Psychology", "source": "book.pdf"})
+    assert first[1][0] == "tails drive"
+    assert list(batches[1])[0][1] == {"title": "Book", "source": "book.pdf"}
+
+    with pytest.raises(ValueError):
+        list(chunk_pages(pages, "book.pdf", "Book", "fast", 200, 40, 2))
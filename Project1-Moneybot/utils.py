@@ -1,15 +1,105 @@
 import re
+import os
+import json
+import queue
+import hashlib
+import threading
+from itertools import islice
+from collections import Counter
+
+CLEAN_RE = re.compile(r'(?:\s|[^\w\s.,!?;:\-()\'"])+') # any run of whitespace and/or problematic characters
 
 def clean_text(text): # to avoid error while tokenizing
     if not text or not isinstance(text, str):
         return ""
 
-    # Remove extra whitespace and normalize spacing
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
+    # Remove problematic characters but keep basic punctuation, and normalize spacing.
+    # one pass: every run of whitespace/removed characters becomes a single space
+    return CLEAN_RE.sub(' ', text).strip()
+
+
+def file_hash(path): # hash of the raw file bytes, changes whenever the pdf changes
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids(source, texts, seen=None): # content hashed ids so the same chunk always gets the same id
+    # pass the same `seen` counter for every batch of one file when ids are made batch by batch
+    ids = []
+    seen = Counter() if seen is None else seen
+    for text in texts:
+        digest = hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()[:32]
+        seen[digest] += 1
+        # same text repeated inside one file gets a running suffix so ids stay unique
+        ids.append(digest if seen[digest] == 1 else f"{digest}-{seen[digest]}")
+    return ids
+
+
+def load_json(path, default):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path, data): # write to a temp file first so a crash never leaves half a file behind
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def batched(iterable, size): # yields lists of up to `size` items without materialising the iterable
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+_DONE = object()
+
+def prefetch(iterable, depth):
+    """
+    Runs `iterable` in a background thread and yields its items. At most `depth`
+    items are buffered, the producer blocks once the buffer is full (backpressure),
+    so parsing can run ahead of embedding without ever holding more than `depth` batches.
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(entry): # gives up once the consumer went away, so the thread never hangs
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
 
-    # Remove problematic characters but keep basic punctuation
-    text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\'\"]+', ' ', text)
-    text = re.sub(r'\s+', ' ', text)  # Clean up any new multiple spaces
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except Exception as e: # hand the error over to the consumer
+            put((_DONE, e))
 
-    return text.strip()
\ No newline at end of file
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
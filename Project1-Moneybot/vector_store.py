@@ -0,0 +1,132 @@
+import os
+import json
+import numpy as np
+
+# compact copy of the chunk embeddings: unit length vectors stored as int8 (one float32 scale
+# per row) or float16 in a memory-mapped .npy, so a replica only pages in what it touches.
+# 384 dim MiniLM vectors take 1536 bytes as float32, 388 as int8 and 768 as float16.
+# the float32 rows are kept next to it in a memory-mapped .float.npy for the exact re-rank, which
+# only touches the pages of its few candidates (chroma would load its whole hnsw segment for them)
+
+BLOCK_ROWS = 65536 # rows scored at a time, bounds the temporary float32 copy during a search
+
+
+def unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors, dtype):
+    # returns (stored rows, scales). scales is None for float16
+    vectors = unit_rows(vectors)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class QuantizedStore:
+    def __init__(self, ids, vectors, scales, exact=None):
+        self.ids = ids
+        self.vectors = vectors # (n, dim) int8 or float16, usually a read only memmap
+        self.scales = scales # (n,) float32 for int8, None for float16
+        self.exact = exact # (n, dim) float32 unit rows for the re-rank, read only memmap
+        self.row_of = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, path, pages, count, dtype="int8"):
+        """
+        pages: iterable of (ids, embeddings) chunks, count: total number of rows.
+        Rows are written straight into the memory-mapped files (quantized and float32),
+        so the full float32 matrix is never held in memory.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        ids = []
+        vectors = exact = scales = None
+        for page_ids, embeddings in pages:
+            rows, row_scales = quantize(embeddings, dtype)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(f"{path}.tmp.npy", mode="w+", dtype=rows.dtype, shape=(count, rows.shape[1]))
+                exact = np.lib.format.open_memmap(f"{path}.float.tmp.npy", mode="w+", dtype=np.float32, shape=(count, rows.shape[1]))
+                if row_scales is not None:
+                    scales = np.zeros(count, dtype=np.float32)
+            start = len(ids)
+            vectors[start:start + len(rows)] = rows
+            exact[start:start + len(rows)] = unit_rows(embeddings)
+            if scales is not None:
+                scales[start:start + len(rows)] = row_scales
+            ids.extend(page_ids)
+        if vectors is None:
+            return None
+        vectors.flush()
+        exact.flush()
+        del vectors, exact
+
+        os.replace(f"{path}.tmp.npy", f"{path}.npy")
+        os.replace(f"{path}.float.tmp.npy", f"{path}.float.npy")
+        if scales is not None:
+            np.save(f"{path}.scales.npy", scales[:len(ids)])
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "dtype": dtype}, f)
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(f"{path}.json") or not os.path.exists(f"{path}.npy"):
+            return None
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        ids = meta["ids"]
+        vectors = np.load(f"{path}.npy", mmap_mode="r")[:len(ids)]
+        scales = np.load(f"{path}.scales.npy") if meta["dtype"] == "int8" else None
+        exact = np.load(f"{path}.float.npy", mmap_mode="r")[:len(ids)] if os.path.exists(f"{path}.float.npy") else None
+        return cls(ids, vectors, scales, exact)
+
+    def exact_vectors(self, chunk_ids):
+        # {chunk_id: float32 row} for the ids in the store, reads only their rows from the memmap
+        known = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id in self.row_of]
+        if self.exact is None or not known:
+            return {}
+        rows = np.asarray(self.exact[sorted(self.row_of[chunk_id] for chunk_id in known)])
+        ordered = sorted(known, key=self.row_of.get)
+        return dict(zip(ordered, rows))
+
+    def scores(self, queries):
+        # approximate cosine similarity of every row with every query, shape (n, n_queries)
+        queries = unit_rows(np.atleast_2d(queries)).T
+        out = np.empty((len(self.ids), queries.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.ids), BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            out[start:start + len(block)] = block @ queries
+        if self.scales is not None:
+            out *= self.scales[:, None]
+        return out
+
+    def search(self, queries, top_k):
+        # top_k (row ids, approximate similarity) per query, best first
+        scores = self.scores(queries)
+        top_k = min(top_k, len(self.ids))
+        results = []
+        for q in range(scores.shape[1]):
+            column = scores[:, q]
+            rows = np.argpartition(-column, top_k - 1)[:top_k] if top_k < len(column) else np.arange(len(column))
+            rows = rows[np.argsort(-column[rows], kind="stable")]
+            results.append([(self.ids[i], float(column[i])) for i in rows])
+        return results
+
+
+def exact_rerank(query, candidates, top_k):
+    # candidates: [(chunk_id, float32 embedding)], returns [(chunk_id, cosine similarity)] best first
+    if not candidates:
+        return []
+    matrix = unit_rows([vector for _, vector in candidates])
+    similarity = matrix @ unit_rows(query)
+    order = np.argsort(-similarity, kind="stable")[:top_k]
+    return [(candidates[i][0], float(similarity[i])) for i in order]
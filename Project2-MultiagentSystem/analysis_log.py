@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# =========================
+# LOG SETTINGS
+# =========================
+
+# one json line per write_for_analysis call, appended and never rewritten
+ANALYSIS_LOG_PATH = "analysis.jsonl"
+
+# the list-of-entries file the log is compacted into
+ANALYSIS_JSON_PATH = "analysis.json"
+
+
+# =========================
+# FILE LOCK
+# =========================
+
+if sys.platform == "win32":
+    import msvcrt
+
+    def _lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1) # retries for ~10s, then raises OSError
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(path: str):
+    # exclusive lock on a sidecar file, held across processes (and threads, each open is its own handle)
+    with open(f"{path}.lock", "a+b") as f:
+        _lock(f)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+# =========================
+# ANALYSIS LOG
+# =========================
+
+class AnalysisLog:
+    """
+    Append-only analysis log. Every append writes one line under the file lock, tagged with the
+    id of the scan its summaries come from ("run", see summary_store.current_scan). Duplicates
+    are skipped per scan, against what is on disk: a restarted or concurrent process reading the
+    same scan skips the paths already logged for it, and a folder flagged again after a new scan
+    is logged again with its new summary. The paths of the current scan are kept in memory and
+    topped up with whatever other writers appended since the last call, so an append costs the
+    same however long the log is.
+    """
+
+    def __init__(self, path: str = ANALYSIS_LOG_PATH):
+        self.path = path
+        self.run: Optional[str] = None # scan id the entries in `seen` belong to
+        self.seen: Set[str] = set() # folder paths already logged for that scan
+        self.offset = 0 # bytes of the log already folded into `seen`
+        self.lock = threading.Lock()
+
+    def use_scan(self, scan_id: Optional[str]):
+        # switches the dedupe to another scan, its paths are re-read from the whole log on the next catch_up
+        if scan_id != self.run:
+            self.run = scan_id
+            self.seen.clear()
+            self.offset = 0
+
+    def read_entries(self, start: int = 0) -> Tuple[List[Dict], int, bool]:
+        """
+        Entries in the log from byte `start`, the offset after the last complete line and
+        whether the file ends in a torn line (a writer died mid-append).
+        """
+        if not os.path.exists(self.path):
+            return [], 0, False
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError: # a torn line that was later closed by the newline below
+                continue
+        return entries, start + end, end < len(data)
+
+    def legacy_entries(self, json_path: str) -> List[Dict]:
+        # the entries of an analysis.json written before the log existed: they carry no "run"
+        # and are not at the start of the log already
+        if not os.path.exists(json_path) or os.path.getsize(json_path) == 0:
+            return []
+        with open(json_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        if not isinstance(existing, list):
+            existing = [existing]
+        if not existing or any("run" in entry for entry in existing):
+            return []
+        logged = self.read_entries()[0]
+        if logged and {key: value for key, value in logged[0].items() if key != "run"} == existing[0]:
+            return []
+        return existing
+
+    def import_json(self, json_path: str = ANALYSIS_JSON_PATH) -> int:
+        """
+        One-off migration (python analysis_log.py --import-json): an analysis.json written before
+        the log existed goes in front of the log, tagged as run "imported". Returns the entries
+        imported; nothing happens once the file was imported or was written by compact().
+        """
+        with self.lock, file_lock(self.path):
+            existing = self.legacy_entries(json_path)
+            if not existing:
+                return 0
+            logged = b""
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    logged = f.read()
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as f:
+                for entry in existing:
+                    f.write((json.dumps({**entry, "run": "imported"}, ensure_ascii=False) + "\n").encode("utf-8"))
+                f.write(logged)
+            os.replace(tmp, self.path)
+            self.offset = 0 # offsets moved, re-read the current scan's entries
+            self.seen.clear()
+            self.catch_up()
+            self.compact_locked(json_path) # so the same file is never imported twice
+            return len(existing)
+
+    def catch_up(self) -> bool:
+        entries, self.offset, torn = self.read_entries(self.offset)
+        for entry in entries:
+            if entry.get("run") == self.run:
+                self.seen.update(entry.get("folder_paths", []))
+        return torn
+
+    def append(self, folder_paths: List[str], summaries: List, scan_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Logs the folder paths not logged for scan_id yet, each once (with their summaries when
+        the two lists line up). Returns the entry written, or None if every path was a duplicate.
+        """
+        with self.lock, file_lock(self.path):
+            self.use_scan(scan_id)
+            torn = self.catch_up()
+
+            keep, taken = [], set()
+            for i, path in enumerate(folder_paths):
+                if path not in self.seen and path not in taken: # repeats within this call count too
+                    keep.append(i)
+                    taken.add(path)
+            if not keep:
+                return None
+            if len(summaries) == len(folder_paths):
+                summaries = [summaries[i] for i in keep]
+            entry = {"folder_paths": [folder_paths[i] for i in keep], "summaries": summaries, "run": self.run}
+
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+            if torn:
+                line = "\n" + line # end the broken line instead of gluing this entry onto it
+            with open(self.path, "ab") as f:
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+                self.offset = f.tell()
+            self.seen.update(entry["folder_paths"])
+            return entry
+
+    def compact(self, json_path: str = ANALYSIS_JSON_PATH) -> Optional[int]:
+        """
+        Writes the log as analysis.json ([{"folder_paths", "summaries", "run"}, ...]), replacing
+        the old file in one step. Returns the number of entries, or None when analysis.json still
+        holds entries from before the log that were never imported (it is left alone then).
+        """
+        with self.lock, file_lock(self.path):
+            return self.compact_locked(json_path)
+
+    def compact_locked(self, json_path: str) -> Optional[int]:
+        if self.legacy_entries(json_path):
+            print(f"{json_path} was written before {self.path} existed and is kept as is, "
+                  f"run `python analysis_log.py --import-json` once to move it into the log")
+            return None
+        entries = self.read_entries()[0]
+        tmp = f"{json_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=4)
+        os.replace(tmp, json_path)
+        return len(entries)
+
+
+analysis_log = AnalysisLog()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild analysis.json from analysis.jsonl")
+    parser.add_argument("--import-json", action="store_true",
+                        help="first move the entries of an analysis.json from before the log into it (once)")
+    args = parser.parse_args()
+    if args.import_json:
+        print(f"{analysis_log.import_json()} entries imported from {ANALYSIS_JSON_PATH}")
+    written = analysis_log.compact()
+    if written is not None:
+        print(f"{written} entries written to {ANALYSIS_JSON_PATH}")
@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import shutil
+import argparse
+import platform
+import contextlib
+import tempfile
+import subprocess
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+from scanner import SCAN_ROOTS_ENV
+
+
+# benchmark of the pc manager on a synthetic file system: generates user profiles with user
+# folders, project trees and ignored folders, then times the three tools and the whole graph
+# on the scripted model from fake_llm.py. everything runs inside a scratch folder, results are json:
+#   python benchmark.py --out before.json
+#   python benchmark.py --compare before.json      # exits with 1 if something got slower
+
+
+# =========================
+# SYNTHETIC FILE SYSTEM
+# =========================
+
+BENCH_USER_FOLDERS = ["Desktop", "Documents", "Downloads", "Pictures", "Music", "Videos"]
+IGNORED_NAMES = ["AppData", ".cache", "$Recycle.Bin", ".git"]
+MARKERS = ["package.json", "pyproject.toml", "go.mod", "Cargo.toml", "pom.xml"]
+
+# extension mixes a user folder is filled from
+EXTENSION_MIXES = {
+    "tidy": [".pdf", ".docx"],
+    "photos": [".jpg", ".jpeg", ".png", ".heic"],
+    "media": [".mp3", ".mp4", ".mkv", ".flac"],
+    "messy": [".exe", ".msi", ".zip", ".rar", ".pdf", ".docx", ".tmp", ".crdownload", ".jpg", ".txt", ".csv", ".iso"],
+}
+
+
+def touch_files(folder: str, count: int, extensions: List[str], rng: random.Random) -> int:
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        open(os.path.join(folder, f"file{i}{rng.choice(extensions)}"), "w").close()
+    return count
+
+
+def make_tree(root: str, users: int, depth: int, fanout: int, files: int, project_ratio: float,
+              ignored_ratio: float, messy_ratio: float, seed: int) -> Dict:
+    """
+    root/user<N>/ with the user folders (filled from an extension mix, messy ones get subfolders)
+    and a work/ tree `depth` levels deep with `fanout` dirs per level. A share of the work dirs are
+    projects (a marker file and a subtree the scan must prune) or ignored names.
+    """
+    rng = random.Random(seed)
+    counts = {"users": users, "dirs": 0, "files": 0, "user_folders": 0, "projects": 0, "ignored": 0}
+
+    def work_tree(path: str, level: int):
+        os.makedirs(path, exist_ok=True)
+        counts["dirs"] += 1
+        counts["files"] += touch_files(path, 2, [".txt", ".log"], rng)
+        if level == depth:
+            return
+        for i in range(fanout):
+            roll = rng.random()
+            if roll < project_ratio:
+                project = os.path.join(path, f"project{i}")
+                counts["files"] += touch_files(os.path.join(project, "src", "lib"), 5, [".py", ".js"], rng) + 1
+                open(os.path.join(project, rng.choice(MARKERS)), "w").close()
+                counts["dirs"] += 3
+                counts["projects"] += 1
+            elif roll < project_ratio + ignored_ratio:
+                ignored = os.path.join(path, rng.choice(IGNORED_NAMES), "inner")
+                counts["files"] += touch_files(ignored, 5, [".dat"], rng)
+                counts["dirs"] += 2
+                counts["ignored"] += 1
+            else:
+                work_tree(os.path.join(path, f"dir{i}"), level + 1)
+
+    for user in range(users):
+        home = os.path.join(root, f"user{user}")
+        for name in BENCH_USER_FOLDERS:
+            messy = rng.random() < messy_ratio
+            mix = EXTENSION_MIXES["messy"] if messy else EXTENSION_MIXES[rng.choice(["tidy", "photos", "media"])]
+            folder = os.path.join(home, name)
+            counts["files"] += touch_files(folder, rng.randint(files // 2, files * 2) if messy else rng.randint(1, files // 2), mix, rng)
+            counts["dirs"] += 1
+            counts["user_folders"] += 1
+            if messy:
+                counts["files"] += touch_files(os.path.join(folder, "old stuff"), 3, mix, rng)
+                counts["dirs"] += 1
+        work_tree(os.path.join(home, "work"), 0)
+    return counts
+
+
+def age_tree(root: str, seconds: float = 3600):
+    # a real tree was not written a moment ago; fresh mtimes would all fall in the scanner's racy window
+    stamp = time.time() - seconds
+    for path, _, _ in os.walk(root):
+        os.utime(path, (stamp, stamp))
+
+
+def touch_dirs(root: str, share: float, seed: int) -> int:
+    # adds a file to a share of the directories, so their mtime changes for the incremental rescan
+    rng = random.Random(seed)
+    touched = 0
+    for path, dirs, _ in os.walk(root):
+        if rng.random() < share:
+            open(os.path.join(path, "touched.txt"), "w").close()
+            touched += 1
+    return touched
+
+
+# =========================
+# MEASURING
+# =========================
+
+def latency_stats(seconds: List[float]) -> Dict:
+    ms = np.asarray(seconds) * 1000
+    if not len(ms):
+        return {}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"n": len(ms), "mean_ms": round(float(ms.mean()), 3), "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3)}
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Wall time of every graph node run (folder branches overlap) and the number of llm calls."""
+
+    def __init__(self):
+        self.started = {}
+        self.seconds: Dict[str, List[float]] = {}
+        self.llm_calls = 0
+
+    def on_chain_start(self, serialized, inputs, *, run_id, tags=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # the node itself, not the routers and runnables inside it
+        if node and kwargs.get("name") == node and any(tag.startswith("graph:step") for tag in tags or []):
+            self.started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id in self.started:
+            node, started = self.started.pop(run_id)
+            self.seconds.setdefault(node, []).append(time.perf_counter() - started)
+
+    on_chain_error = on_chain_end
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.llm_calls += 1
+
+
+def bench_scan(tools, root: str, seed: int) -> Dict:
+    results = {}
+    for name, full, touch in [("cold", True, 0.0), ("warm", False, 0.0), ("touched_5pct", False, 0.05)]:
+        touched = touch_dirs(root, touch, seed) if touch else 0
+        started = time.perf_counter()
+        result = tools.scan_user_folders_across_drives.invoke({"full_rescan": full})
+        seconds = time.perf_counter() - started
+        results[name] = {"seconds": round(seconds, 4), "touched_dirs": touched, "user_folders": result["user_folders_found"],
+                         "cache_hits": result["cache_hits"], "cache_misses": result["cache_misses"]}
+    dirs = results["cold"]["cache_misses"]
+    results["dirs"] = dirs
+    results["dirs_per_s"] = round(dirs / results["cold"]["seconds"], 1) if results["cold"]["seconds"] else None
+    return results
+
+
+def bench_reads(tools, count: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    seconds, rows = [], 0
+    started = time.perf_counter()
+    for _ in range(count):
+        folder = rng.choice(BENCH_USER_FOLDERS)
+        t = time.perf_counter()
+        result = tools.read_summaries_by_folder.invoke({"folder_name": folder, "offset": 0, "limit": 20})
+        seconds.append(time.perf_counter() - t)
+        rows += len(result.get("summaries", {}))
+    total = time.perf_counter() - started
+    return {"calls_per_s": round(count / total, 1), "rows": rows, "latency": latency_stats(seconds)}
+
+
+def bench_writes(tools, count: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    seconds, duplicates = [], 0
+    started = time.perf_counter()
+    for i in range(count):
+        index = rng.randrange(count) if rng.random() < 0.2 else i # about 1 in 5 writes repeats a path
+        t = time.perf_counter()
+        result = tools.write_for_analysis.invoke({"data": {"folder_paths": [f"/bench/folder{index}"],
+                                                           "summaries": [{"file_count": index}]}})
+        seconds.append(time.perf_counter() - t)
+        duplicates += result["status"] == "duplicate"
+    total = time.perf_counter() - started
+    return {"calls_per_s": round(count / total, 1), "duplicates": duplicates, "latency": latency_stats(seconds)}
+
+
+def reset_analysis():
+    # every graph run starts from an empty analysis log
+    from analysis_log import analysis_log, ANALYSIS_JSON_PATH
+    for path in (analysis_log.path, ANALYSIS_JSON_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+    analysis_log.seen.clear()
+    analysis_log.offset = 0
+
+
+def bench_graph(main, mode: str, prescore: bool, concurrency: int) -> Dict:
+    reset_analysis()
+    main.ANALYSIS_MODE = mode
+    main.PRESCORE = prescore
+    timer = NodeTimer()
+    started = time.perf_counter()
+    result = main.agent.invoke(main.initial_state, config={"callbacks": [timer], "max_concurrency": concurrency,
+                                                           "recursion_limit": main.GRAPH_RECURSION_LIMIT})
+    seconds = time.perf_counter() - started
+    with open(main.analysis_log.path, "rb") as f:
+        flagged = sum(len(json.loads(line)["folder_paths"]) for line in f if line.strip())
+    return {
+        "seconds": round(seconds, 3), "llm_calls": timer.llm_calls, "flagged_paths": flagged,
+        "answer_chars": len(result["processed_q_data"][-1].content),
+        "nodes": {node: dict(latency_stats(values), total_s=round(sum(values), 4)) for node, values in sorted(timer.seconds.items())},
+    }
+
+
+# =========================
+# REPORT
+# =========================
+
+# (path in the report, higher is better)
+TRACKED = [
+    (("scan", "cold", "seconds"), False),
+    (("scan", "warm", "seconds"), False),
+    (("scan", "touched_5pct", "seconds"), False),
+    (("reads", "calls_per_s"), True),
+    (("reads", "latency", "p95_ms"), False),
+    (("writes", "calls_per_s"), True),
+    (("writes", "latency", "p95_ms"), False),
+    (("graph", "parallel", "seconds"), False),
+    (("graph", "parallel", "llm_calls"), False),
+    (("graph", "sequential", "seconds"), False),
+    (("graph", "sequential", "llm_calls"), False),
+]
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float, min_delta_ms: float) -> List[Dict]:
+    # relative change beyond tolerance, latencies must also have moved by min_delta_ms (timer noise)
+    regressions = []
+    for path, higher_is_better in TRACKED:
+        new, old = report, baseline
+        for key in path:
+            new = new.get(key) if isinstance(new, dict) else None
+            old = old.get(key) if isinstance(old, dict) else None
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        if path[-1] == "seconds" and abs(new - old) * 1000 < min_delta_ms:
+            continue
+        if path[-1].endswith("_ms") and abs(new - old) < min_delta_ms:
+            continue
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append({"metric": ".".join(path), "baseline": old, "current": new, "change": round(change, 3)})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="scan/tool throughput and graph latency on a synthetic file system")
+    parser.add_argument("--users", type=int, default=10, help="user profiles")
+    parser.add_argument("--depth", type=int, default=3, help="levels of the work tree per user")
+    parser.add_argument("--fanout", type=int, default=4, help="directories per level")
+    parser.add_argument("--files", type=int, default=30, help="typical files per user folder")
+    parser.add_argument("--project-ratio", type=float, default=0.2, help="share of work dirs that are projects")
+    parser.add_argument("--ignored-ratio", type=float, default=0.1, help="share of work dirs with ignored names")
+    parser.add_argument("--messy-ratio", type=float, default=0.3, help="share of user folders with mixed files")
+    parser.add_argument("--reads", type=int, default=500)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per scripted llm call")
+    parser.add_argument("--concurrency", type=int, default=4, help="folder branches at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep the tree and outputs here instead of a temporary folder")
+    parser.add_argument("--out", help="write the report to this json file")
+    parser.add_argument("--compare", help="baseline report, exit with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown for --compare")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="time changes below this are noise")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="pc_manager_bench_"))
+    if not args.workdir:
+        atexit.register(shutil.rmtree, workdir, True)
+    root = os.path.join(workdir, "home")
+    out = os.path.abspath(args.out) if args.out else None
+    compare_with = os.path.abspath(args.compare) if args.compare else None
+
+    # the tools write summaries.db, scan_cache.json and analysis.jsonl to the working directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    os.environ[SCAN_ROOTS_ENV] = root
+    os.environ["PC_MANAGER_FAKE_LLM"] = str(args.llm_latency)
+    import tools
+    import main as graph_main # imported only now, it reads the environment at import time
+
+    started = time.perf_counter()
+    tree = make_tree(root, args.users, args.depth, args.fanout, args.files, args.project_ratio,
+                     args.ignored_ratio, args.messy_ratio, args.seed)
+    age_tree(root)
+    tree["generate_s"] = round(time.perf_counter() - started, 3)
+
+    with contextlib.redirect_stdout(sys.stderr): # the nodes' progress prints, stdout is for the report
+        scan = bench_scan(tools, root, args.seed)
+        reads = bench_reads(tools, args.reads, args.seed)
+        writes = bench_writes(tools, args.writes, args.seed)
+        graph = {
+            "parallel": bench_graph(graph_main, "parallel", True, args.concurrency),
+            "parallel_llm_only": bench_graph(graph_main, "parallel", False, args.concurrency),
+            "sequential": bench_graph(graph_main, "sequential", True, args.concurrency),
+        }
+
+    report = {
+        "commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+        "machine": platform.machine(), "cpus": os.cpu_count(),
+        "settings": {"scan_workers": tools.SCAN_WORKERS, "llm_latency_s": args.llm_latency,
+                     "concurrency": args.concurrency, "prompt_tokens": graph_main.PROMPT_TOKEN_BUDGET},
+        "tree": tree, "scan": scan, "reads": reads, "writes": writes, "graph": graph,
+        "tool_timings": {"file": graph_main.tool_executor.timings, "folder": graph_main.folder_executor.timings},
+    }
+
+    if compare_with:
+        with open(compare_with, "r", encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+
+    print(json.dumps(report, indent=2))
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
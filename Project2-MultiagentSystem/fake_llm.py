@@ -0,0 +1,106 @@
+import re
+import ast
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+# =========================
+# SCRIPTED CHAT MODEL
+# =========================
+
+# folders with at least this many files (or any subfolder) are flagged by the script
+FLAG_FILE_COUNT = 20
+
+FOLDER_PATTERN = re.compile(r"(?:following folders:|ONE folder:)\s*(\w+)")
+
+
+def tool_result(message: ToolMessage) -> Any:
+    # tool results reach the model as json or as str(dict), depending on the node that ran the tool
+    try:
+        return json.loads(message.content)
+    except ValueError:
+        try:
+            return ast.literal_eval(message.content)
+        except (ValueError, SyntaxError):
+            return message.content
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatGroq that plays the agents' part deterministically:
+      orchestor  -> {"agent": "file", "processed_query": <the user query>}
+      file agent -> scan (if the scan tool is bound and was not called yet), read the summaries
+                    of its folder, write the paths that look cluttered, then a final report
+    The reply depends only on the messages, so concurrent branches get the same answers in any
+    order. latency (seconds) is slept on every call to stand in for the network round trip.
+    """
+
+    latency: float = 0.0
+    tool_names: List[str] = []
+    calls: List[int] = [] # one element per invoke, shared by the copies bind_tools makes
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tool_names": [tool.name for tool in tools]})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls.append(1)
+        return ChatResult(generations=[ChatGeneration(message=self.reply(messages))])
+
+    def reply(self, messages: List[BaseMessage]) -> AIMessage:
+        system = "\n".join(m.content for m in messages if isinstance(m, SystemMessage))
+        if not self.tool_names:
+            query = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            return AIMessage(content=json.dumps({"agent": "file", "processed_query": query}))
+
+        # the next step follows from the newest tool result alone, older turns may have been trimmed away
+        names = {call["id"]: call["name"] for m in messages if isinstance(m, AIMessage) for call in m.tool_calls}
+        last = next((m for m in reversed(messages) if isinstance(m, ToolMessage)), None)
+        last_name = names.get(last.tool_call_id, last.name) if last is not None else None
+        last_result = tool_result(last) if last is not None else None
+        match = FOLDER_PATTERN.search(system)
+        folder = match.group(1) if match else ""
+
+        if "read_summaries_by_folder" not in self.tool_names and last_name is None:
+            # pre-scored branch: the summaries to judge come in the last human message, shaped like a read result
+            last_human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+            last_name, last_result = "read_summaries_by_folder", tool_result(last_human) if last_human else {}
+
+        scanned = last_name is not None or "the scan is done" in " ".join(
+            m.content for m in messages if isinstance(m, (SystemMessage, HumanMessage)))
+        if "scan_user_folders_across_drives" in self.tool_names and not scanned:
+            return self.call("scan_user_folders_across_drives", {})
+        if last_name in (None, "scan_user_folders_across_drives"):
+            return self.call("read_summaries_by_folder", {"folder_name": folder})
+        if last_name == "read_summaries_by_folder":
+            flagged = self.flagged(last_result)
+            if flagged:
+                return self.call("write_for_analysis", {"data": {"folder_paths": [path for path, _ in flagged],
+                                                                 "summaries": [summary for _, summary in flagged]}})
+            return AIMessage(content=f"{folder}: no clutter found.")
+        written = last_result.get("folder_paths", []) if isinstance(last_result, dict) else []
+        return AIMessage(content=f"{folder}: flagged {len(written)} folder(s).")
+
+    def flagged(self, read_result: Dict) -> List:
+        if not isinstance(read_result, dict):
+            return []
+        flagged = []
+        for path, summaries in read_result.get("summaries", {}).items():
+            for summary in summaries:
+                if summary["file_count"] >= FLAG_FILE_COUNT or summary["subfolder_count"] > 0:
+                    flagged.append((path, summary))
+        return flagged
+
+    def call(self, name: str, args: Dict) -> AIMessage:
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{name}_{len(self.calls)}"}])
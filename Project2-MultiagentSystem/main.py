@@ -1,18 +1,74 @@
 from os import write
 
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage, AIMessage, RemoveMessage
+from langchain_core.messages.utils import trim_messages, count_tokens_approximately
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
+from langgraph.types import Send
 from typing_extensions import TypedDict
 from typing import Annotated
 from tools import scan_user_folders_across_drives, USER_FOLDERS, read_summaries_by_folder, write_for_analysis
+from tools import TOOL_ACCESS, TOOL_TIMEOUTS
+from tool_executor import ToolExecutor
+from analysis_log import analysis_log
+from summary_store import read_all, folder_key
+from scoring import score_summaries, triage
+from routing import fast_route
 
 from pathlib import Path
+import os
 import json
+import time
+import operator
+import threading
 load_dotenv()
 
+# "parallel": scan once, then one analysis branch per user folder (map), merged at the end (reduce)
+# "sequential": the file_node -> tool_node loop, one folder after the other
+ANALYSIS_MODE = os.environ.get("PC_MANAGER_ANALYSIS_MODE", "parallel")
+# folder branches running at the same time (each one waits on the llm most of its time)
+FOLDER_CONCURRENCY = int(os.environ.get("PC_MANAGER_FOLDER_CONCURRENCY", "4"))
+# llm turns one folder branch may take before its report is cut off
+MAX_TOOL_ROUNDS = 6
+# score every summary locally first (scoring.py): clear cases are written straight away, tidy
+# folders are skipped and only the borderline ones are sent to the llm. parallel mode only,
+# the sequential loop always lets the llm judge every folder
+PRESCORE = os.environ.get("PC_MANAGER_PRESCORE", "1") != "0"
+# cap on the (approximate) tokens of every prompt: the oldest tool turns are dropped first, then the
+# newest tool results are cut. only the fixed part (system prompt, query, records) is never cut
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PC_MANAGER_PROMPT_TOKENS", "6000"))
+# (approximate) tokens of borderline paths per review prompt, more are reviewed in further pages
+REVIEW_PAGE_TOKENS = PROMPT_TOKEN_BUDGET // 2
+# appended to a tool result that was cut to fit the prompt
+TRUNCATED_NOTE = "... [cut to fit the prompt budget, ask for a smaller page]"
+# characters of a finished folder's final answer kept in its record
+RECORD_REPORT_CHARS = 300
+# set to a latency in seconds (e.g. 0.5) to run on the scripted offline model from fake_llm.py
+FAKE_LLM_ENV = "PC_MANAGER_FAKE_LLM"
+# route clear-cut queries with keyword rules (routing.py), the orchestor llm only sees the rest
+FAST_ROUTE = os.environ.get("PC_MANAGER_FAST_ROUTE", "1") != "0"
+
+
+def make_llm():
+    if os.environ.get(FAKE_LLM_ENV):
+        from fake_llm import ScriptedChatModel
+        return ScriptedChatModel(latency=float(os.environ[FAKE_LLM_ENV]))
+    return ChatGroq(model="openai/gpt-oss-20b", temperature=0)
+
+
+# one client per role for the whole process, with its tools bound once (the clients are thread safe)
+llm_clients = {}
+llm_clients_lock = threading.Lock()
+
+def llm_client(role: str, bound_tools: list = None):
+    with llm_clients_lock:
+        if role not in llm_clients:
+            llm = make_llm()
+            llm_clients[role] = llm.bind_tools(bound_tools) if bound_tools else llm
+        return llm_clients[role]
+
 
 # Define your agent's state - this is your agent's memory
 class State(TypedDict):# used to define dictionary-like objects with fixed keys and types.
@@ -22,13 +78,28 @@ class State(TypedDict):# used to define dictionary-like objects with fixed keys
     process_sys_msg: str
     agent_choice: str
     folder_index: int
+    folder_reports: Annotated[list, operator.add] # one {"folder", "report", "tool_calls", "llm_calls"} per folder branch
+    folder_records: Annotated[list, operator.add] # one compact record per finished folder (sequential mode)
+    scanned: bool # the scan tool ran, kept here so trimming its turn away does not trigger another scan
+
+
+# What one folder branch gets from the fan-out
+class FolderTask(TypedDict):
+    folder: str
+    processed_q_data: list
+    scored: list # this folder's entries from scoring.score_summaries, when PRESCORE is on
 
 tools = [scan_user_folders_across_drives, read_summaries_by_folder, write_for_analysis]
+folder_tools = [read_summaries_by_folder, write_for_analysis] # the scan is done once, before the fan-out
+
+# tool registries are built once; the calls of one llm turn run concurrently (see tool_executor.py)
+tool_executor = ToolExecutor(tools, TOOL_ACCESS, TOOL_TIMEOUTS)
+folder_executor = ToolExecutor(folder_tools, TOOL_ACCESS, TOOL_TIMEOUTS)
 
 # Routers
 def router(state:State):
     if state["agent_choice"] == "file":
-        return "file"
+        return "scan" if ANALYSIS_MODE == "parallel" else "file"
     return "process"
 
 def proceed(state: State):
@@ -38,17 +109,90 @@ def proceed(state: State):
         return "tool"
     return "advance"
 
+def more_folders(state: State):
+    if state["folder_index"] < len(USER_FOLDERS):
+        return "next"
+    return "done"
+
+def folder_record(folder: str, messages: list) -> dict:
+    # what later folders need to know about a finished one, instead of its whole conversation
+    flagged, tool_calls = [], 0
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            tool_calls += 1
+            if tool_call["name"] == "write_for_analysis":
+                flagged.extend(tool_call["args"].get("data", {}).get("folder_paths", []))
+    final = next((m.content for m in reversed(messages) if isinstance(m, AIMessage) and not m.tool_calls), "")
+    return {"folder": folder, "flagged": flagged, "tool_calls": tool_calls, "report": final[:RECORD_REPORT_CHARS]}
+
 def advance_folder(state: State):
-    # Move to next folder after one full cycle
+    # Move to next folder after one full cycle. The finished folder's messages are replaced by a
+    # compact record, only the query that started the file workflow stays in processed_q_data
+    idx = state["folder_index"]
+    query, *finished = state["processed_q_data"]
+    record = folder_record(USER_FOLDERS[idx] if idx < len(USER_FOLDERS) else "", finished)
+    update = [RemoveMessage(id=message.id) for message in finished]
+    if idx + 1 >= len(USER_FOLDERS):
+        records = state.get("folder_records", []) + [record]
+        update.append(AIMessage(content="\n\n".join(f"{r['folder']}:\n{r['report']}" for r in records)))
     return {
-        "folder_index": state["folder_index"] + 1
+        "folder_index": idx + 1,
+        "processed_q_data": update,
+        "folder_records": [record]
     }
 
+def fit_tool_results(messages: list, budget: int) -> list:
+    # cuts the tool results in messages down to an even share of budget, when they do not fit as they are
+    results = [m for m in messages if isinstance(m, ToolMessage)]
+    if not results or count_tokens_approximately(messages) <= budget:
+        return messages
+    others = count_tokens_approximately([m for m in messages if not isinstance(m, ToolMessage)])
+    share = max(budget - others, 0) // len(results)
+    chars = max((share - 10) * 4 - len(TRUNCATED_NOTE), 0) # ~4 characters a token, 10 tokens of message overhead
+    return [m.model_copy(update={"content": m.content[:chars] + TRUNCATED_NOTE})
+            if isinstance(m, ToolMessage) and count_tokens_approximately([m]) > share else m
+            for m in messages]
+
+def fit_prompt(fixed: list, history: list) -> list:
+    """
+    fixed + as much of the end of history as fits PROMPT_TOKEN_BUDGET. The newest llm turn is
+    always kept (the model needs it to go on), its tool results are cut if they are too big for
+    what is left of the budget. Older turns are dropped whole, so a tool call never loses its
+    result. fixed itself is never cut, a warning is printed when it alone is over the budget.
+    """
+    last_turn = max((i for i, m in enumerate(history) if isinstance(m, AIMessage)), default=len(history))
+    older, newest = history[:last_turn], history[last_turn:]
+    budget = PROMPT_TOKEN_BUDGET - count_tokens_approximately(fixed)
+    if budget < 0:
+        print(f"prompt budget: system prompt, query and records alone are {-budget} tokens over {PROMPT_TOKEN_BUDGET}")
+    newest = fit_tool_results(newest, max(budget, 0))
+    budget -= count_tokens_approximately(newest)
+    kept = trim_messages(older, max_tokens=max(budget, 0), token_counter=count_tokens_approximately,
+                         strategy="last", start_on=("human", "ai"), allow_partial=False) if older else []
+    return [*fixed, *kept, *newest]
+
+def records_message(records: list, scanned: bool) -> list:
+    # the scan and the finished folders, one line each, for the prompt of the next step
+    if not records and not scanned:
+        return []
+    head = "Already done: the scan is done, do not scan again." if scanned else "Already done:"
+    lines = [f"- {r['folder']}: flagged {r['flagged'] or 'nothing'}" for r in records]
+    return [HumanMessage(content="\n".join([head, *lines]))]
+
 # The nodes
 
 # orchestor
 def orchestor(state: State):
-    orc_llm = ChatGroq(model="openai/gpt-oss-20b", temperature=0)
+    if FAST_ROUTE:
+        started = time.perf_counter()
+        query = next((m.content for m in reversed(state["user_query"]) if isinstance(m, HumanMessage)), "")
+        agent_choice, hits = fast_route(query)
+        if agent_choice is not None:
+            # clear keyword match, no llm round trip. the query goes on as the user wrote it
+            print(f"routed to {agent_choice} locally in {(time.perf_counter() - started) * 1000:.2f}ms {hits}")
+            return {"agent_choice": agent_choice, "processed_q_data": [HumanMessage(content=query.strip())]}
+
+    orc_llm = llm_client("orchestor")
     response = orc_llm.invoke(state["user_query"]) # response in json inside string
     # remove ```json and ```
     clean = response.content.strip().removeprefix("```json").removesuffix("```").strip()
@@ -59,8 +203,7 @@ def orchestor(state: State):
 
 # File managing nodes
 def file_manager(state: State):
-    file_llm = ChatGroq(model="openai/gpt-oss-20b", temperature=0)
-    llm_tool = file_llm.bind_tools(tools)
+    llm_tool = llm_client("file", tools)
     idx = state["folder_index"]
 
     # STOP condition handled here
@@ -73,7 +216,8 @@ def file_manager(state: State):
     current_folder = ""
     if idx != len(USER_FOLDERS):
         current_folder = USER_FOLDERS[idx]
-    response = llm_tool.invoke([
+    query, *history = state["processed_q_data"]
+    response = llm_tool.invoke(fit_prompt([
         SystemMessage(
             content= f"""You are a file organization assistant for Windows 10 or later systems.
 
@@ -115,35 +259,24 @@ def file_manager(state: State):
             Your goal is to produce accurate, deterministic analysis of file organization
             and resolve the clutter and file organizational problems present in user system.
             """),
-        *state["processed_q_data"] # * means expanding the list
-    ])
+        query,
+        *records_message(state.get("folder_records", []), state.get("scanned", False))
+    ], history)) # only the current folder's turns are in history, trimmed to the token budget
     print("agent responded...")
     return {"processed_q_data":response}
 
 def file_tools_node(state: State):
     """Your agent's hands - executes the chosen tools."""
-    tool_registry = {tool.name: tool for tool in tools}# {"Duck_search": duckduckgoToolObject}
-
     last_message = state["processed_q_data"][-1]# consists of the ai message
-    tool_messages = []
 
-    # Execute each tool the agent requested
+    # Execute every tool the agent requested, side by side, results come back in call order
     print(last_message.tool_calls)
-    for tool_call in last_message.tool_calls:
-        tool = tool_registry[tool_call["name"]]
-        print(tool_call["name"])
-        print(tool_call["args"])
-        result = tool.invoke(tool_call["args"])
-
-        # Send the result back to the agent - appending the ToolMessage object
-        tool_messages.append(ToolMessage(
-            content=result,
-            tool_call_id=tool_call["id"]
-        ))
-        # print(tool_messages)
+    tool_messages = tool_executor.run(last_message.tool_calls)
     print("agent successfully called tools...\n")
 
-    return {"processed_q_data": state["processed_q_data"] + tool_messages}
+    # add_messages appends, returning the whole history again would only make it dedupe by id
+    scanned = any(tool_call["name"] == scan_user_folders_across_drives.name for tool_call in last_message.tool_calls)
+    return {"processed_q_data": tool_messages, "scanned": state.get("scanned", False) or scanned}
 
 
 
@@ -153,6 +286,133 @@ def process_manager(state: State):
     pass
 
 
+# Parallel folder analysis (map-reduce)
+def scan_node(state: State):
+    # one scan for all branches, they only read the stored summaries
+    result = scan_user_folders_across_drives.invoke({})
+    print(f"scan done: {result}")
+    return {}
+
+def fan_out(state: State):
+    # one branch per folder, LangGraph runs them side by side (at most max_concurrency at once)
+    scored_by_folder = {}
+    if PRESCORE:
+        # one vectorised pass over every summary of the scan, then split per folder name
+        for entry in score_summaries(read_all()):
+            scored_by_folder.setdefault(folder_key(entry["path"]), []).append(entry)
+    return [Send("folder_node", {"folder": folder, "processed_q_data": state["processed_q_data"],
+                                 "scored": scored_by_folder.get(folder.lower(), [])})
+            for folder in USER_FOLDERS]
+
+def review_pages(entries: list) -> list:
+    # the borderline entries split into pages of about REVIEW_PAGE_TOKENS (at least one entry each)
+    pages, page, size = [], [], 0
+    for entry in entries:
+        tokens = count_tokens_approximately([HumanMessage(content=json.dumps(entry))])
+        if page and size + tokens > REVIEW_PAGE_TOKENS:
+            pages.append(page)
+            page, size = [], 0
+        page.append(entry)
+        size += tokens
+    return pages + [page] if page else pages
+
+# shared by the folder prompts of both analysis modes
+FOLDER_PROMPT_HEAD = """You are a file organization assistant for Windows 10 or later systems.
+            You ONLY analyze file structure and report issues, you never modify anything."""
+WRITE_TOOL_RULE = """call the write tool with a single argument "data"
+               holding folder_paths (list of folder paths) and summaries (their summaries)."""
+
+def run_tool_loop(fixed: list, llm_tool, executor: ToolExecutor, folder: str):
+    """
+    The llm/tool loop of one folder conversation: at most MAX_TOOL_ROUNDS llm turns, every
+    prompt fitted to the budget, the tool calls of a turn run by executor.
+    Returns (final report, tool calls, llm calls).
+    """
+    messages = []
+    tool_calls, llm_calls, response = 0, 0, None
+    for _ in range(MAX_TOOL_ROUNDS):
+        response = llm_tool.invoke(fit_prompt(fixed, messages))
+        llm_calls += 1
+        messages.append(response)
+        if not response.tool_calls:
+            break
+        tool_calls += len(response.tool_calls)
+        messages.extend(executor.run(response.tool_calls))
+
+    report = response.content if response is not None and not response.tool_calls else f"{folder}: no final report"
+    return report, tool_calls, llm_calls
+
+def review_page(folder: str, task: FolderTask, entries: list, page: int, pages: int):
+    """One llm conversation about one page of borderline paths, returns (report, tool calls, llm calls)."""
+    review = {"folder": folder, "page": f"{page} of {pages}",
+              "summaries": {entry["path"]: [entry["summary"]] for entry in entries},
+              "scores": {entry["path"]: {"score": entry["score"], "signals": entry["signals"]} for entry in entries}}
+    fixed = [
+        SystemMessage(content=f"""{FOLDER_PROMPT_HEAD}
+            You review borderline paths of ONE folder: {folder}
+            Each path comes with its summary and a local clutter score (0-1) with the signals behind it.
+            If and ONLY IF a path is disorganized, {WRITE_TOOL_RULE}
+            Finish with a short report. Do NOT invent paths. Never output an empty response."""),
+        *task["processed_q_data"],
+        HumanMessage(content=json.dumps(review))
+    ]
+    return run_tool_loop(fixed, llm_client("review", [write_for_analysis]), folder_executor, folder)
+
+def prescored_folder(folder: str, task: FolderTask):
+    """Writes the clear-cut paths itself and asks the llm only about the borderline ones, a page at a time."""
+    groups = triage(task["scored"])
+    if groups["auto"]:
+        write_for_analysis.invoke({"data": {"folder_paths": [entry["path"] for entry in groups["auto"]],
+                                            "summaries": [entry["summary"] for entry in groups["auto"]]}})
+    lines = [f"{entry['path']}: score {entry['score']} ({', '.join(entry['signals'])})" for entry in groups["auto"]]
+    summary = (f"{len(groups['auto'])} flagged by score, {len(groups['review'])} reviewed, "
+               f"{len(groups['tidy'])} tidy")
+    if not groups["review"]:
+        print(f"{folder} analysed without llm")
+        return {"folder_reports": [{"folder": folder, "report": "\n".join([summary, *lines]), "tool_calls": 0,
+                                    "llm_calls": 0}]}
+
+    pages = review_pages(groups["review"])
+    reports, tool_calls, llm_calls = [], 0, 0
+    for page, entries in enumerate(pages, 1):
+        report, page_tool_calls, page_llm_calls = review_page(folder, task, entries, page, len(pages))
+        reports.append(report)
+        tool_calls += page_tool_calls
+        llm_calls += page_llm_calls
+
+    print(f"{folder} analysed")
+    return {"folder_reports": [{"folder": folder, "report": "\n".join([summary, *lines, *reports]),
+                                "tool_calls": tool_calls, "llm_calls": llm_calls}]}
+
+def folder_node(task: FolderTask):
+    """One folder's analysis: the llm reads its summaries and writes what looks cluttered."""
+    folder = task["folder"]
+    if PRESCORE:
+        return prescored_folder(folder, task)
+    fixed = [
+        SystemMessage(content=f"""{FOLDER_PROMPT_HEAD}
+            The file system has already been scanned. You analyse ONE folder: {folder}
+
+            1. Call the JSON read tool with the folder name {folder} to get its folder summaries.
+               If next_offset is not null, call it again with that offset for the rest.
+            2. Look for disorganization in each path: many files at the root level with few subfolders,
+               many unrelated extensions mixed together, temporary/installer/archive/document files mixed,
+               a catch-all folder, any subfolder count above 0, signs of long-term storage.
+            3. If and ONLY IF you see disorganization, {WRITE_TOOL_RULE}
+            4. Finish with a short report for {folder}. Do NOT invent paths. Never output an empty response."""),
+        *task["processed_q_data"]
+    ]
+    report, tool_calls, llm_calls = run_tool_loop(fixed, llm_client("folder", folder_tools), folder_executor, folder)
+    print(f"{folder} analysed")
+    return {"folder_reports": [{"folder": folder, "report": report, "tool_calls": tool_calls, "llm_calls": llm_calls}]}
+
+def merge_reports(state: State):
+    # branches finish in any order, the answer lists the folders in USER_FOLDERS order
+    reports = sorted(state["folder_reports"], key=lambda r: USER_FOLDERS.index(r["folder"]))
+    content = "\n\n".join(f"{r['folder']}:\n{r['report']}" for r in reports)
+    return {"processed_q_data": [AIMessage(content=content)]}
+
+
 # Build the complete workflow
 def create_agent():
     graph = StateGraph(State)
@@ -161,16 +421,25 @@ def create_agent():
     graph.add_node("tool_node", file_tools_node)
     graph.add_node("orchestor", orchestor)
     graph.add_node("advance_node", advance_folder)
+    graph.add_node("scan_node", scan_node)
+    graph.add_node("folder_node", folder_node)
+    graph.add_node("merge_node", merge_reports)
     # Set the starting point
     graph.set_entry_point("orchestor")
     # Add the flow logic
-    graph.add_conditional_edges("orchestor", router, {"file": "file_node", "process": END})
+    graph.add_conditional_edges("orchestor", router, {"file": "file_node", "scan": "scan_node", "process": END})
     graph.add_conditional_edges("file_node", proceed, {"tool": "tool_node", "advance": "advance_node"})
     graph.add_edge("tool_node", "file_node")
+    graph.add_conditional_edges("advance_node", more_folders, {"next": "file_node", "done": END})
+    graph.add_conditional_edges("scan_node", fan_out, ["folder_node"])
+    graph.add_edge("folder_node", "merge_node")
+    graph.add_edge("merge_node", END)
     return graph.compile()
 
 # Create and use your enhanced agent
 agent = create_agent()
+# sequential mode takes three steps (llm, tools, back) per tool turn, for every folder
+GRAPH_RECURSION_LIMIT = 25 + 3 * MAX_TOOL_ROUNDS * len(USER_FOLDERS)
 
 
 
@@ -185,6 +454,12 @@ initial_state = {
     ],
 "folder_index": 0
 }
-# final output
-result = agent.invoke(initial_state)
-print(result["processed_q_data"][-1].content)
\ No newline at end of file
+
+if __name__ == "__main__":
+    # final output
+    result = agent.invoke(initial_state, config={"max_concurrency": FOLDER_CONCURRENCY,
+                                                 "recursion_limit": GRAPH_RECURSION_LIMIT})
+    print(result["processed_q_data"][-1].content)
+    # the run appended to analysis.jsonl, rebuild analysis.json from it
+    analysis_log.compact()
+    print(f"tool timings: {tool_executor.timings} {folder_executor.timings}")
\ No newline at end of file
@@ -0,0 +1,49 @@
+import re
+from typing import Optional, Tuple
+
+
+# =========================
+# ROUTING RULES
+# =========================
+
+# words that point a query at one of the agents, matched as whole words (case-insensitive)
+ROUTE_KEYWORDS = {
+    "file": [
+        "file", "files", "folder", "folders", "directory", "directories", "dir", "drive", "drives", "disk",
+        "storage", "scan", "scanning", "organize", "organise", "organizing", "organising", "clutter",
+        "cluttered", "declutter", "tidy", "clean up", "cleanup", "desktop", "documents", "downloads",
+        "pictures", "photos", "music", "videos", "duplicate", "duplicates", "file structure",
+    ],
+    "process": [
+        "process", "processes", "task manager", "cpu", "ram", "memory usage", "running", "kill",
+        "terminate", "end task", "startup", "service", "services", "background apps", "lagging",
+        "freezing", "overheating", "performance", "resource usage",
+    ],
+}
+
+ROUTE_PATTERNS = {
+    agent: re.compile(r"\b(?:" + "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)) + r")\b",
+                      re.IGNORECASE)
+    for agent, words in ROUTE_KEYWORDS.items()
+}
+
+# a query is routed locally when only one agent's keywords match, or when one agent has at least
+# this many more distinct keyword hits than the other
+ROUTE_MARGIN = 2
+
+
+# =========================
+# FAST PATH ROUTER
+# =========================
+
+def fast_route(query: str) -> Tuple[Optional[str], dict]:
+    """
+    ("file" | "process", hits) when the keywords make the choice clear, (None, hits) when the
+    orchestrator llm should decide. hits holds the matched words per agent, for the logs.
+    """
+    hits = {agent: sorted({match.lower() for match in pattern.findall(query)}) for agent, pattern in ROUTE_PATTERNS.items()}
+    ranked = sorted(hits, key=lambda agent: len(hits[agent]), reverse=True)
+    best, runner_up = ranked[0], ranked[1]
+    if hits[best] and (not hits[runner_up] or len(hits[best]) - len(hits[runner_up]) >= ROUTE_MARGIN):
+        return best, hits
+    return None, hits
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import string
+import time
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# =========================
+# SCAN SETTINGS
+# =========================
+
+# extra roots can be given as a path list (os.pathsep separated) in this environment variable
+SCAN_ROOTS_ENV = "PC_MANAGER_SCAN_ROOTS"
+
+# directory listings are i/o bound, threads overlap them well beyond the core count
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# directories one task lists before handing the rest of its subtree back to the pool
+DIRS_PER_TASK = 256
+
+# a cached listing is only trusted if the directory's mtime is at least this much older than the
+# listing, a change in the same clock tick as the listing would otherwise go unnoticed
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def default_scan_roots() -> List[str]:
+    """
+    Windows: every existing drive (C:/ .. Z:/). Elsewhere: /home and /Users (plus the
+    current home folder if it lives somewhere else). Overridden by PC_MANAGER_SCAN_ROOTS.
+    """
+    configured = os.environ.get(SCAN_ROOTS_ENV)
+    if configured:
+        return [root for root in configured.split(os.pathsep) if root]
+
+    if sys.platform == "win32":
+        return [f"{letter}:/" for letter in string.ascii_uppercase[2:] if os.path.exists(f"{letter}:/")]
+
+    roots = [root for root in ("/home", "/Users") if os.path.isdir(root)]
+    home = str(Path.home())
+    if not any(home == root or home.startswith(root + "/") for root in roots):
+        roots.append(home)
+    return roots
+
+
+# =========================
+# SCANNER
+# =========================
+
+class Scanner:
+    """
+    Finds user folders (Desktop, Documents, ...) below the scan roots and summarises each one.
+
+    Every directory is listed exactly once with os.scandir, and its DirEntry objects answer
+    the is_dir/is_file questions from the listing itself, so there is no extra stat per
+    entry. That single listing decides whether the directory is pruned (project markers),
+    summarised (user folder) or descended into. Subtrees are spread over a thread pool.
+
+    With a cache_path the outcome of every directory is kept on disk, keyed by the directory's
+    mtime (which changes whenever an entry is added, removed or renamed in it). A rescan stats
+    each directory and only lists the ones whose mtime changed. rules_version should describe
+    should_ignore, cached outcomes from other rules are thrown away.
+    """
+
+    def __init__(self, user_folders: Iterable[str], should_ignore: Callable[[str], bool], markers: Iterable[str],
+                 max_extension_types: int, workers: int = SCAN_WORKERS, cache_path: Optional[str] = None,
+                 rules_version: str = ""):
+        self.user_folders = set(user_folders)
+        self.should_ignore = should_ignore
+        self.markers = set(markers)
+        self.max_extension_types = max_extension_types
+        self.workers = max(1, workers)
+        self.cache_path = cache_path
+        self.rules = json.dumps([sorted(self.user_folders), sorted(self.markers), max_extension_types, rules_version])
+        self.cache = {} # path -> {"mtime", "listed", "root", "outcome", "summaries", "subdirs"}, from the last scan
+        self.fresh = {} # the same, for directories seen by the running scan
+        self.full = False
+        self.stats = {}
+
+    def list_dir(self, path: str) -> Optional[List[os.DirEntry]]:
+        try:
+            with os.scandir(path) as entries:
+                return list(entries)
+        except OSError: # permission denied, vanished while scanning, ...
+            return None
+
+    def summarise(self, path: str, entries: List[os.DirEntry]) -> List[Dict]:
+        """
+        Summary of a user folder from its listing. Only the folder itself, no recursion.
+        """
+        if self.should_ignore(Path(path).name) or any(entry.name in self.markers for entry in entries):
+            return []
+
+        file_count = 0
+        subfolder_count = 0
+        extensions = Counter()
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    file_count += 1
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if ext:
+                        extensions[ext] += 1
+                elif entry.is_dir():
+                    subfolder_count += 1
+            except OSError:
+                continue
+
+        return [{
+            "path": path.replace("\\", "/"),
+            "depth": 0,  # user folder is always depth 0
+            "file_count": file_count,
+            "subfolder_count": subfolder_count,
+            "extensions": dict(extensions.most_common(self.max_extension_types))
+        }]
+
+    def visit(self, path: str, is_root: bool) -> Tuple[str, Optional[List[Dict]], List[str], bool]:
+        """
+        Decides what to do with one directory, from the cache if its mtime did not change.
+        Returns (outcome, summaries, subdirectories to visit next, cache hit).
+        """
+        if self.cache_path is None:
+            return self.decide(path, is_root) + (False,)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return "unreadable", None, [], False
+
+        cached = None if self.full else self.cache.get(path)
+        if (cached and cached["mtime"] == mtime and cached["root"] == is_root
+                and cached["listed"] - mtime >= RACY_WINDOW_NS):
+            self.fresh[path] = cached
+            return cached["outcome"], cached["summaries"], cached["subdirs"], True
+
+        listed = time.time_ns()
+        outcome, summaries, subdirs = self.decide(path, is_root)
+        if outcome != "unreadable": # permissions may change without touching mtime, retry those every time
+            self.fresh[path] = {"mtime": mtime, "listed": listed, "root": is_root, "outcome": outcome,
+                                "summaries": summaries, "subdirs": subdirs}
+        return outcome, summaries, subdirs, False
+
+    def decide(self, path: str, is_root: bool) -> Tuple[str, Optional[List[Dict]], List[str]]:
+        """
+        Lists one directory and decides what to do with it.
+        Returns (outcome, summaries, subdirectories to visit next).
+        """
+        entries = self.list_dir(path)
+        if entries is None:
+            return "unreadable", None, []
+        # a directory holding a project is pruned as a whole (the scan roots themselves never are)
+        if not is_root and any(entry.name in self.markers for entry in entries):
+            return "pruned", None, []
+        if Path(path).name in self.user_folders:
+            return "summarised", self.summarise(path, entries), [] # stop diving into this user folder
+
+        subdirs = []
+        for entry in entries:
+            try:
+                # symlinked directories are not followed (like os.walk), so there are no cycles
+                if entry.is_dir(follow_symlinks=False) and not self.should_ignore(entry.name):
+                    subdirs.append(entry.path)
+            except OSError:
+                continue
+        return "descended", None, subdirs
+
+    def scan_subtree(self, start: List[Tuple[str, bool]]) -> Tuple[Dict, Counter, List[Tuple[str, bool]]]:
+        # depth first from `start` for up to DIRS_PER_TASK directories, what is left goes back to the pool
+        results = {}
+        counts = Counter()
+        stack = list(start)
+        while stack and counts["visited"] < DIRS_PER_TASK:
+            path, is_root = stack.pop()
+            outcome, summaries, subdirs, hit = self.visit(path, is_root)
+            counts["visited"] += 1
+            counts[outcome] += 1
+            if self.cache_path is not None:
+                counts["cache_hits" if hit else "cache_misses"] += 1
+            if summaries is not None:
+                results[path.replace("\\", "/")] = summaries
+            stack.extend((subdir, False) for subdir in reversed(subdirs))
+        return results, counts, stack
+
+    def load_cache(self):
+        self.cache = {}
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e: # a broken cache only costs one full scan
+            print(f"scan cache ignored: {e}")
+            return
+        if data.get("rules") == self.rules:
+            self.cache = data["dirs"]
+
+    def save_cache(self):
+        # only directories reached by this scan are kept, deleted or newly pruned subtrees drop out
+        tmp = f"{self.cache_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rules": self.rules, "dirs": self.fresh}, f, separators=(",", ":"))
+        os.replace(tmp, self.cache_path)
+
+    def scan(self, roots: Iterable[str], full: bool = False) -> Dict[str, List[Dict]]:
+        """
+        {user folder path: [summary]} for every user folder found below roots, sorted by path.
+        full=True ignores the cache and lists every directory again (the cache is rewritten).
+        Counts (directories visited, pruned, cache hits/misses, seconds) are left in self.stats.
+        """
+        started = time.perf_counter()
+        self.full = full
+        self.fresh = {}
+        if self.cache_path and not full:
+            self.load_cache()
+        results = {}
+        counts = Counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(self.scan_subtree, [(root, True)]) for root in roots if os.path.isdir(root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, task_counts, leftover = future.result()
+                    results.update(found)
+                    counts.update(task_counts)
+                    # every unfinished directory becomes a task of its own, idle threads pick them up
+                    pending.update(pool.submit(self.scan_subtree, [item]) for item in leftover)
+
+        if self.cache_path:
+            self.save_cache()
+            self.cache = self.fresh
+        self.stats = dict(counts, user_folders=len(results), seconds=round(time.perf_counter() - started, 3))
+        return dict(sorted(results.items()))
@@ -0,0 +1,112 @@
+from typing import Dict, List
+
+import numpy as np
+
+
+# =========================
+# SCORING RULES
+# =========================
+
+# extension -> kind of file, for the "installers/archives/documents mixed together" signal
+EXTENSION_KINDS = {
+    "installer": {".exe", ".msi", ".msix", ".appx", ".dmg", ".pkg", ".deb", ".rpm", ".apk", ".iso"},
+    "archive": {".zip", ".rar", ".7z", ".tar", ".gz", ".bz2", ".xz", ".tgz"},
+    "document": {".pdf", ".doc", ".docx", ".odt", ".rtf", ".txt", ".md", ".xls", ".xlsx", ".csv", ".ppt", ".pptx"},
+    "temporary": {".tmp", ".temp", ".part", ".crdownload", ".partial", ".bak", ".old", ".log"},
+    "image": {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".heic", ".svg"},
+    "media": {".mp3", ".wav", ".flac", ".m4a", ".mp4", ".mkv", ".avi", ".mov", ".wmv"},
+}
+KINDS = list(EXTENSION_KINDS)
+KIND_OF = {ext: i for i, kind in enumerate(KINDS) for ext in EXTENSION_KINDS[kind]}
+
+# root level file count at which the "too many files" signal saturates
+FILE_COUNT_LIMIT = 50
+# distinct extensions at which the "mixed extensions" signal saturates (summaries keep the top 10)
+EXTENSION_LIMIT = 8
+
+# signal -> weight, the weights add up to 1 so scores stay in [0, 1]
+WEIGHTS = {
+    "many_files": 0.35,       # lots of files at the root level
+    "flat": 0.15,             # many files but (almost) no subfolders to sort them into
+    "subfolders": 0.15,       # any subfolder at all, the prompt's own rule
+    "mixed_extensions": 0.15, # many unrelated extensions
+    "mixed_kinds": 0.20,      # installers/archives/documents/temporary files side by side
+}
+SIGNALS = list(WEIGHTS)
+
+# below REVIEW_THRESHOLD a folder is taken as tidy, from AUTO_WRITE_THRESHOLD on it is written
+# without asking the llm, everything in between is what the llm gets to judge
+REVIEW_THRESHOLD = 0.3
+AUTO_WRITE_THRESHOLD = 0.7
+
+# signals that are hard rules of the prompt: a folder showing one is never taken as tidy,
+# whatever its score ("if subfolder count is more than 0 then it should be treated as disorganized")
+HARD_SIGNALS = {"subfolders"}
+
+
+# =========================
+# SCORING
+# =========================
+
+def score_summaries(summaries: Dict[str, List[Dict]]) -> List[Dict]:
+    """
+    Scores every {path: [summary]} entry in one vectorised pass.
+    Returns [{"path", "summary", "score", "signals"}] ranked by score, highest first;
+    signals holds each signal's weighted contribution, so the score explains itself.
+    """
+    rows = [(path, summary) for path, entries in summaries.items() for summary in entries]
+    if not rows:
+        return []
+
+    files = np.array([summary["file_count"] for _, summary in rows], dtype=np.float64)
+    subfolders = np.array([summary["subfolder_count"] for _, summary in rows], dtype=np.float64)
+
+    # extension counters as a (folders x kinds) count matrix and the number of distinct extensions
+    kind_counts = np.zeros((len(rows), len(KINDS)), dtype=np.float64)
+    distinct = np.zeros(len(rows), dtype=np.float64)
+    row_index, kind_index, counts = [], [], []
+    for i, (_, summary) in enumerate(rows):
+        extensions = summary.get("extensions", {})
+        distinct[i] = len(extensions)
+        for ext, count in extensions.items():
+            kind = KIND_OF.get(ext)
+            if kind is not None:
+                row_index.append(i)
+                kind_index.append(kind)
+                counts.append(count)
+    np.add.at(kind_counts, (np.array(row_index, dtype=np.intp), np.array(kind_index, dtype=np.intp)), counts)
+
+    many_files = np.minimum(files / FILE_COUNT_LIMIT, 1.0)
+    signals = np.stack([
+        many_files,
+        many_files * (subfolders <= 1),
+        (subfolders > 0).astype(np.float64),
+        np.minimum(distinct / EXTENSION_LIMIT, 1.0),
+        # 0 for one kind of file, 1 when four or more kinds share the folder
+        np.clip(((kind_counts > 0).sum(axis=1) - 1) / 3, 0.0, 1.0),
+    ], axis=1) * np.array([WEIGHTS[name] for name in SIGNALS])
+    scores = signals.sum(axis=1)
+
+    ranked = []
+    for i in np.argsort(-scores, kind="stable"):
+        path, summary = rows[i]
+        ranked.append({
+            "path": path,
+            "summary": summary,
+            "score": round(float(scores[i]), 3),
+            "signals": {name: round(float(value), 3) for name, value in zip(SIGNALS, signals[i]) if value > 0},
+        })
+    return ranked
+
+
+def triage(scored: List[Dict]) -> Dict[str, List[Dict]]:
+    # {"auto": clear-cut clutter, "review": for the llm, "tidy": left alone}
+    groups = {"auto": [], "review": [], "tidy": []}
+    for entry in scored:
+        if entry["score"] >= AUTO_WRITE_THRESHOLD:
+            groups["auto"].append(entry)
+        elif entry["score"] >= REVIEW_THRESHOLD or HARD_SIGNALS & set(entry["signals"]):
+            groups["review"].append(entry)
+        else:
+            groups["tidy"].append(entry)
+    return groups
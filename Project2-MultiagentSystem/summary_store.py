@@ -0,0 +1,88 @@
+import json
+import uuid
+import sqlite3
+from contextlib import closing
+from pathlib import PurePath
+from typing import Dict, List, Optional, Tuple
+
+
+# =========================
+# STORE SETTINGS
+# =========================
+
+# folder summaries of the last scan, one row per user folder path
+SUMMARIES_DB_PATH = "summaries.db"
+
+# rows returned per read when the caller does not ask for a page size
+PAGE_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    summaries TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS summaries_by_folder ON summaries (folder, path);
+CREATE TABLE IF NOT EXISTS scan (
+    id TEXT NOT NULL
+);
+"""
+
+
+# =========================
+# STORE
+# =========================
+
+def folder_key(path: str) -> str:
+    # "C:/Users/me/Documents" -> "documents", the name a user folder is looked up by
+    return PurePath(path.replace("\\", "/")).name.lower()
+
+
+def connect(db_path: str = SUMMARIES_DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def write_summaries(results: Dict[str, List[Dict]], db_path: str = SUMMARIES_DB_PATH) -> str:
+    """
+    Replaces the stored summaries with the ones of a finished scan ({path: [summary]}),
+    in one transaction, so readers never see half a scan. Returns the new scan id.
+    """
+    rows = [(path, folder_key(path), json.dumps(summaries)) for path, summaries in results.items()]
+    scan_id = uuid.uuid4().hex
+    with closing(connect(db_path)) as conn:
+        with conn:
+            conn.execute("DELETE FROM summaries")
+            conn.executemany("INSERT INTO summaries (path, folder, summaries) VALUES (?, ?, ?)", rows)
+            conn.execute("DELETE FROM scan")
+            conn.execute("INSERT INTO scan (id) VALUES (?)", (scan_id,))
+    return scan_id
+
+
+def current_scan(db_path: str = SUMMARIES_DB_PATH) -> Optional[str]:
+    # id of the scan the stored summaries come from, None before the first scan
+    with closing(connect(db_path)) as conn:
+        row = conn.execute("SELECT id FROM scan").fetchone()
+    return row[0] if row else None
+
+
+def read_folder(folder_name: str, offset: int = 0, limit: Optional[int] = PAGE_SIZE,
+                db_path: str = SUMMARIES_DB_PATH) -> Tuple[Dict[str, List[Dict]], int]:
+    """
+    ({path: [summary]}, total) for the user folders named folder_name (case-insensitive),
+    ordered by path, limit rows from offset. Both queries are range scans of the folder index.
+    """
+    folder = folder_name.strip().lower()
+    with closing(connect(db_path)) as conn:
+        total = conn.execute("SELECT COUNT(*) FROM summaries WHERE folder = ?", (folder,)).fetchone()[0]
+        rows = conn.execute("SELECT path, summaries FROM summaries WHERE folder = ? ORDER BY path LIMIT ? OFFSET ?",
+                            (folder, -1 if limit is None else limit, offset)).fetchall()
+    return {path: json.loads(summaries) for path, summaries in rows}, total
+
+
+def read_all(db_path: str = SUMMARIES_DB_PATH) -> Dict[str, List[Dict]]:
+    # every stored {path: [summary]}, for passes over the whole scan (e.g. scoring.py)
+    with closing(connect(db_path)) as conn:
+        rows = conn.execute("SELECT path, summaries FROM summaries ORDER BY path").fetchall()
+    return {path: json.loads(summaries) for path, summaries in rows}
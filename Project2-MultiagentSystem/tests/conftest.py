@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules are run as scripts from Project2-MultiagentSystem, make them importable the same way here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
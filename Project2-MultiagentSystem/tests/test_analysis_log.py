@@ -0,0 +1,43 @@
+import json
+
+from analysis_log import AnalysisLog
+
+
+def logged(log):
+    return [entry["folder_paths"] for entry in log.read_entries()[0]]
+
+
+def test_repeats_within_one_call_are_logged_once(tmp_path):
+    log = AnalysisLog(str(tmp_path / "analysis.jsonl"))
+    entry = log.append(["/x", "/x", "/y"], [{"n": 1}, {"n": 2}, {"n": 3}], "scan1")
+    assert entry["folder_paths"] == ["/x", "/y"]
+    assert entry["summaries"] == [{"n": 1}, {"n": 3}] # summaries stay with their paths
+    assert logged(log) == [["/x", "/y"]]
+
+
+def test_repeats_across_calls_and_processes_are_skipped(tmp_path):
+    path = str(tmp_path / "analysis.jsonl")
+    log = AnalysisLog(path)
+    log.append(["/x"], [], "scan1")
+    assert log.append(["/x"], [], "scan1") is None
+    assert AnalysisLog(path).append(["/x", "/y"], [], "scan1")["folder_paths"] == ["/y"] # a restarted process
+    assert logged(log) == [["/x"], ["/y"]]
+
+
+def test_a_new_scan_logs_a_folder_again(tmp_path):
+    log = AnalysisLog(str(tmp_path / "analysis.jsonl"))
+    log.append(["/x"], [{"file_count": 1}], "scan1")
+    entry = log.append(["/x"], [{"file_count": 2}], "scan2")
+    assert entry == {"folder_paths": ["/x"], "summaries": [{"file_count": 2}], "run": "scan2"}
+
+
+def test_torn_final_line_is_closed_and_skipped(tmp_path):
+    path = tmp_path / "analysis.jsonl"
+    path.write_text(json.dumps({"folder_paths": ["/x"], "summaries": [], "run": "scan1"}) + "\n"
+                    + '{"folder_paths": ["/y"], "summ', encoding="utf-8") # a writer died mid-append
+    log = AnalysisLog(str(path))
+    entries, _, torn = log.read_entries()
+    assert torn and [entry["folder_paths"] for entry in entries] == [["/x"]]
+    assert log.append(["/x", "/y"], [], "scan1")["folder_paths"] == ["/y"]
+    assert logged(log) == [["/x"], ["/y"]]
+    assert not log.read_entries()[2]
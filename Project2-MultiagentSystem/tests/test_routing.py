@@ -0,0 +1,22 @@
+from routing import fast_route
+
+
+def test_one_agent_matching_is_routed_locally():
+    assert fast_route("Please tidy up my Downloads folder")[0] == "file"
+    assert fast_route("Which processes are using the most CPU?")[0] == "process"
+
+
+def test_multi_word_keywords_match_as_a_whole():
+    choice, hits = fast_route("open task manager")
+    assert choice == "process"
+    assert hits["process"] == ["task manager"]
+
+
+def test_mixed_queries_go_to_the_orchestrator_unless_the_margin_is_clear():
+    assert fast_route("is the scan of my files slowing the cpu?")[0] is None # 2 file vs 1 process
+    assert fast_route("scan my files and folders on the drive, is the cpu ok?")[0] == "file" # 4 vs 1
+
+
+def test_no_keywords_go_to_the_orchestrator():
+    assert fast_route("hello there") == (None, {"file": [], "process": []})
+    assert fast_route("profiles")[0] is None # whole words only, "file" inside "profiles" does not count
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+from scanner import Scanner
+
+USER_FOLDERS = {"Desktop", "Documents"}
+MARKERS = {"package.json"}
+
+
+@pytest.fixture
+def home(tmp_path):
+    # home/u/{Desktop, Documents, app (a project), .cache (ignored)}
+    home = tmp_path / "home"
+    for folder in ("u/Desktop/photos", "u/Documents", "u/app/Desktop", "u/.cache/Desktop"):
+        os.makedirs(home / folder)
+    for path in ("u/Desktop/a.txt", "u/Desktop/b.txt", "u/Desktop/c.py", "u/Documents/cv.pdf", "u/app/package.json"):
+        (home / path).write_text("x")
+    # listings of directories changed within RACY_WINDOW_NS are not trusted, backdate the tree
+    old = time.time() - 60
+    for folder, _, _ in os.walk(home):
+        os.utime(folder, (old, old))
+    return home
+
+
+def scan(home, full=False, rules=""):
+    scanner = Scanner(USER_FOLDERS, lambda name: name.startswith("."), MARKERS, 5, workers=2,
+                      cache_path=str(home.parent / "scan_cache.json"), rules_version=rules)
+    results = scanner.scan([str(home)], full=full)
+    return results, scanner.stats.get("cache_hits", 0), scanner.stats.get("cache_misses", 0)
+
+
+def folder(home, name):
+    return f"{home}/u/{name}".replace("\\", "/")
+
+
+def test_scan_summarises_user_folders_and_prunes_projects(home):
+    results, _, misses = scan(home)
+    assert list(results) == [folder(home, "Desktop"), folder(home, "Documents")]
+    (desktop,) = results[folder(home, "Desktop")]
+    assert (desktop["file_count"], desktop["subfolder_count"]) == (3, 1)
+    assert desktop["extensions"] == {".txt": 2, ".py": 1}
+    assert misses == 5 # home, u, Desktop, Documents, app; .cache is never listed
+
+
+def test_rescan_only_lists_changed_directories(home):
+    results, _, _ = scan(home)
+    assert scan(home) == (results, 5, 0) # a new scanner, the cache comes from disk
+
+    (home / "u/Desktop/d.txt").write_text("x") # changes Desktop's mtime only
+    changed, hits, misses = scan(home)
+    assert (hits, misses) == (4, 1)
+    assert changed[folder(home, "Desktop")][0]["file_count"] == 4
+
+
+def test_full_rescan_and_new_rules_ignore_the_cache(home):
+    scan(home)
+    assert scan(home, full=True)[1:] == (0, 5)
+    assert scan(home, rules="node_modules")[1:] == (0, 5)
+
+
+def test_directories_changed_while_listed_are_listed_again(home):
+    os.utime(home / "u/Documents") # changed within the racy window of the first listing
+    scan(home)
+    assert scan(home)[1:] == (4, 1)
@@ -0,0 +1,85 @@
+import json
+import time
+
+from langchain_core.tools import tool
+
+from tool_executor import ToolExecutor
+
+events = []
+
+
+@tool
+def write_target(label: str, seconds: float) -> dict:
+    """Writes to the shared target."""
+    events.append(("write start", label))
+    time.sleep(seconds)
+    events.append(("write end", label))
+    return {"wrote": label}
+
+
+@tool
+def read_target(label: str) -> dict:
+    """Reads the shared target."""
+    events.append(("read", label))
+    return {"read": label}
+
+
+@tool
+def other_target(seconds: float) -> dict:
+    """Works on a target of its own."""
+    time.sleep(seconds)
+    return {"other": True}
+
+
+@tool
+def broken() -> dict:
+    """Always fails."""
+    raise RuntimeError("boom")
+
+
+def make_executor(write_timeout=5.0):
+    access = {"write_target": ("write", "t"), "read_target": ("read", "t"), "other_target": ("write", "o")}
+    return ToolExecutor([write_target, read_target, other_target, broken], access,
+                        {"write_target": write_timeout, "read_target": 1.0})
+
+
+def call(name, i, **args):
+    return {"name": name, "args": args, "id": f"call{i}"}
+
+
+def test_calls_on_one_target_keep_their_order_and_results_come_back_in_call_order():
+    events.clear()
+    executor = make_executor()
+    messages = executor.run([call("read_target", 1, label="r1"), call("write_target", 2, label="w1", seconds=0.2),
+                             call("write_target", 3, label="w2", seconds=0.0), call("read_target", 4, label="r2")])
+    assert [m.tool_call_id for m in messages] == ["call1", "call2", "call3", "call4"]
+    assert [json.loads(m.content) for m in messages] == [{"read": "r1"}, {"wrote": "w1"}, {"wrote": "w2"}, {"read": "r2"}]
+    assert events == [("read", "r1"), ("write start", "w1"), ("write end", "w1"),
+                      ("write start", "w2"), ("write end", "w2"), ("read", "r2")]
+    assert executor.timings["write_target"]["calls"] == 2
+
+
+def test_calls_on_different_targets_run_side_by_side():
+    executor = make_executor()
+    started = time.perf_counter()
+    executor.run([call("write_target", 1, label="w", seconds=0.3), call("other_target", 2, seconds=0.3)])
+    assert time.perf_counter() - started < 0.55
+
+
+def test_failures_come_back_as_error_messages():
+    executor = make_executor()
+    unknown, failed = executor.run([call("missing", 1), call("broken", 2)])
+    assert unknown.status == failed.status == "error"
+    assert "unknown tool missing" in unknown.content
+    assert "broken failed: boom" in failed.content
+    assert executor.run([]) == []
+
+
+def test_an_overrunning_write_holds_back_the_next_run():
+    events.clear()
+    executor = make_executor(write_timeout=0.1)
+    (timed_out,) = executor.run([call("write_target", 1, label="slow", seconds=0.5)])
+    assert timed_out.status == "error" and "timed out" in timed_out.content
+    (read,) = executor.run([call("read_target", 2, label="after")]) # waits for the write to really return
+    assert read.status == "success"
+    assert events == [("write start", "slow"), ("write end", "slow"), ("read", "after")]
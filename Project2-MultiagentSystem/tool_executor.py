@@ -0,0 +1,147 @@
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import ToolMessage
+
+
+# =========================
+# EXECUTOR SETTINGS
+# =========================
+
+# tool calls of one llm turn running at the same time (they are mostly file i/o)
+TOOL_WORKERS = 8
+
+# seconds a tool call may take before the model gets a timeout error instead of its result
+DEFAULT_TOOL_TIMEOUT = 60.0
+
+# tool calls slower than this are printed as they finish
+SLOW_TOOL_SECONDS = 5.0
+
+
+# =========================
+# TOOL EXECUTOR
+# =========================
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one AIMessage concurrently and returns their ToolMessages in call order.
+
+    access maps a tool name to ("read" | "write", target). Calls on the same target keep their
+    order where it matters: a write waits for every earlier call on its target, a read waits for
+    the earlier writes; calls on different targets (or without one) do not wait for each other.
+    The order holds across runs and until a tool really returns: a call that timed out keeps its
+    pool thread, and later calls on its target wait for it. A call that fails, runs past its
+    timeout or is still waiting on an earlier call when its own timeout ends comes back as an
+    error ToolMessage, the model can react to it. Per-tool timings are kept in self.timings.
+    """
+
+    def __init__(self, tools: List, access: Optional[Dict[str, Tuple[str, str]]] = None,
+                 timeouts: Optional[Dict[str, float]] = None, workers: int = TOOL_WORKERS,
+                 default_timeout: float = DEFAULT_TOOL_TIMEOUT):
+        self.registry = {tool.name: tool for tool in tools} # built once, not per call
+        self.access = access or {}
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.workers = max(1, workers)
+        # shared by every run; a timed out call keeps its thread until the tool returns
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tool")
+        self.timings: Dict[str, Dict] = {} # tool name -> {"calls", "errors", "seconds", "max_seconds"}
+        self.lock = threading.Lock()
+        # per target, futures that complete when the tool has really returned (not when it timed out),
+        # shared by every run so an overrunning write still holds back the next turn's calls
+        self.last_write: Dict[str, Future] = {} # target -> latest write
+        self.reads: Dict[str, List[Future]] = {} # target -> reads since that write
+
+    def record(self, name: str, seconds: float, failed: bool):
+        with self.lock:
+            timing = self.timings.setdefault(name, {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0})
+            timing["calls"] += 1
+            timing["errors"] += failed
+            timing["seconds"] += seconds
+            timing["max_seconds"] = max(timing["max_seconds"], seconds)
+        if seconds >= SLOW_TOOL_SECONDS:
+            print(f"slow tool: {name} took {seconds:.2f}s")
+
+    @staticmethod
+    def finish_after(done: Future, after: List[Future]):
+        # completes done once every future in after has, for calls that never reached the pool
+        def check(_=None):
+            if all(future.done() for future in after):
+                try:
+                    done.set_result(None)
+                except InvalidStateError: # another callback got there first
+                    pass
+        for future in after:
+            future.add_done_callback(check)
+        check()
+
+    async def call_tool(self, tool_call: Dict, before: List[asyncio.Future], after: List[Future], done: Future,
+                        limit: asyncio.Semaphore) -> ToolMessage:
+        # before: the earlier calls of this run it depends on (each bounded by its own timeout),
+        # after: the completions of every call it depends on, this run's or an earlier one's
+        if before:
+            await asyncio.wait(before)
+        name = tool_call["name"]
+        tool = self.registry.get(name)
+        timeout = self.timeouts.get(name, self.default_timeout)
+        if tool is None:
+            self.finish_after(done, after)
+            return ToolMessage(content=json.dumps({"error": f"unknown tool {name}"}), name=name,
+                               tool_call_id=tool_call["id"], status="error")
+        if after: # an earlier call that timed out may still be running, give it this call's timeout to finish
+            _, pending = await asyncio.wait([asyncio.wrap_future(future) for future in after], timeout=timeout)
+            if pending:
+                self.finish_after(done, after)
+                self.record(name, timeout, True)
+                return ToolMessage(content=json.dumps({"error": f"{name} not run: an earlier call on "
+                                                                f"{self.access[name][1]} is still running, try again later"}),
+                                   name=name, tool_call_id=tool_call["id"], status="error")
+
+        async with limit:
+            started = time.perf_counter()
+            running = self.pool.submit(tool.invoke, tool_call["args"])
+            running.add_done_callback(lambda _: done.set_result(None))
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(running), timeout)
+                content, status = json.dumps(result, default=str), "success"
+            except asyncio.TimeoutError:
+                content, status = json.dumps({"error": f"{name} timed out after {timeout:g}s, it may still be running"}), "error"
+            except Exception as e: # the model sees the error, the graph keeps running
+                content, status = json.dumps({"error": f"{name} failed: {e}"}), "error"
+            self.record(name, time.perf_counter() - started, status == "error")
+        return ToolMessage(content=content, name=name, tool_call_id=tool_call["id"], status=status)
+
+    async def arun(self, tool_calls: List[Dict]) -> List[ToolMessage]:
+        limit = asyncio.Semaphore(self.workers)
+        tasks = []
+        task_of = {} # completion future -> task of this run
+        with self.lock: # dependencies are taken in call order, also between runs in different threads
+            for tool_call in tool_calls:
+                mode, target = self.access.get(tool_call["name"], (None, None))
+                after = []
+                if target is not None:
+                    if target in self.last_write and not self.last_write[target].done():
+                        after.append(self.last_write[target])
+                    if mode == "write":
+                        after.extend(future for future in self.reads.get(target, []) if not future.done())
+                before = [task_of[future] for future in after if future in task_of]
+                done = Future()
+                if mode == "write":
+                    self.last_write[target] = done
+                    self.reads[target] = []
+                elif mode == "read":
+                    self.reads[target] = [future for future in self.reads.get(target, []) if not future.done()] + [done]
+                task = asyncio.ensure_future(self.call_tool(tool_call, before, after, done, limit))
+                task_of[done] = task
+                tasks.append(task)
+        return list(await asyncio.gather(*tasks))
+
+    def run(self, tool_calls: List[Dict]) -> List[ToolMessage]:
+        # for the sync graph nodes, every call gets its own event loop (nodes may run in threads)
+        if not tool_calls:
+            return []
+        return asyncio.run(self.arun(tool_calls))
@@ -1,9 +1,10 @@
-import os
 import json
 from pathlib import Path
-from collections import Counter
-from typing import List, Dict
+from typing import Dict
 from langchain.tools import tool
+from scanner import Scanner, default_scan_roots, SCAN_WORKERS
+from summary_store import SUMMARIES_DB_PATH, PAGE_SIZE, write_summaries, read_folder, current_scan
+from analysis_log import analysis_log
 
 
 # =========================
@@ -58,6 +59,28 @@ PROJECT_MARKERS = {
 
 MAX_EXTENSION_TYPES = 10
 
+# per directory scan results keyed by mtime, lets a rescan skip listing unchanged directories
+SCAN_CACHE_PATH = "scan_cache.json"
+
+# the scan results are read from summaries.db (see summary_store.py), the json copy is only an export
+EXPORT_SUMMARIES_JSON = True
+SUMMARIES_JSON_PATH = "summaries.json"
+
+# what each tool touches, for running the tool calls of one llm turn concurrently (tool_executor.py):
+# calls on the same target keep their order around writes
+TOOL_ACCESS = {
+    "scan_user_folders_across_drives": ("write", "summaries"),
+    "read_summaries_by_folder": ("read", "summaries"),
+    "write_for_analysis": ("write", "analysis"),
+}
+
+# seconds per tool call, the scan of a whole machine takes a while
+TOOL_TIMEOUTS = {
+    "scan_user_folders_across_drives": 1800.0,
+    "read_summaries_by_folder": 30.0,
+    "write_for_analysis": 30.0,
+}
+
 
 # =========================
 # INTERNAL HELPERS
@@ -75,72 +98,10 @@ def should_ignore_folder(name: str) -> bool:
     return False
 
 
-def has_project_marker(path: str) -> bool:
-    try:
-        entries = set(os.listdir(path))
-        return bool(entries & PROJECT_MARKERS)
-    except Exception:
-        return False
-
-def should_prune_dir(dir_name: str, full_path: str) -> bool:
-    if should_ignore_folder(dir_name):
-        return True
-    if has_project_marker(full_path):
-        return True
-    return False
-
-
-# =========================
-# CORE TRAVERSAL
-# =========================
-
-def search_user_folder(root_path: str) -> List[Dict]:
-    """
-    Analyzes ONLY the user folder itself.
-    Does NOT recurse into subfolders.
-    """
-    summaries = []
-
-    try:
-        entries = os.listdir(root_path)
-    except Exception:
-        return summaries
-
-    folder_name = Path(root_path).name
-
-    if should_ignore_folder(folder_name):
-        return summaries
-
-    if has_project_marker(root_path):
-        return summaries
-
-    file_count = 0
-    subfolder_count = 0
-    extensions = Counter()
-
-    for entry in entries:
-        full_path = os.path.join(root_path, entry)
-
-        if os.path.isfile(full_path):
-            file_count += 1
-            ext = Path(entry).suffix.lower()
-            if ext:
-                extensions[ext] += 1
-
-        elif os.path.isdir(full_path):
-            subfolder_count += 1
-            # 🚫 NO recursion here
-
-    summaries.append({
-        "path": root_path.replace("\\", "/"),
-        "depth": 0,  # user folder is always depth 0
-        "file_count": file_count,
-        "subfolder_count": subfolder_count,
-        "extensions": dict(extensions.most_common(MAX_EXTENSION_TYPES))
-    })
-
-    return summaries
-
+def make_scanner(workers: int = SCAN_WORKERS, cache_path: str = None) -> Scanner:
+    # the pruning rules above, applied by the scandir based scanner (see scanner.py)
+    return Scanner(USER_FOLDERS, should_ignore_folder, PROJECT_MARKERS, MAX_EXTENSION_TYPES, workers,
+                   cache_path=cache_path, rules_version=",".join(sorted(IGNORE_FOLDERS_BY_NAME)))
 
 
 # =========================
@@ -148,68 +109,51 @@ def search_user_folder(root_path: str) -> List[Dict]:
 # =========================
 
 @tool
-def scan_user_folders_across_drives() -> Dict:
-    """Scan the system to search user folders in the whole system"""
-    results = {}
-
-    for drive_letter in "CDEFGHIJKLMNOPQRSTUVWXYZ":
-        drive_path = Path(f"{drive_letter}:/")
-        if not drive_path.exists():
-            continue
-
-        for root, dirs, _ in os.walk(drive_path, topdown=True):
-            # 🔴 PRUNE FIRST
-            pruned_dirs = [] # list containing dirs which needs trversal
-            for d in dirs:
-                full = os.path.join(root, d)
-                if not should_prune_dir(d, full):
-                    pruned_dirs.append(d)
-            dirs[:] = pruned_dirs  # critical
-
-            folder_name = Path(root).name
-
-            if folder_name in USER_FOLDERS:
-                key = root.replace("\\", "/")
-                results[key] = search_user_folder(root)
-
-                # stop diving into this user folder
-                dirs.clear()
-
-    with open("summaries.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=4)
+def scan_user_folders_across_drives(full_rescan: bool = False) -> Dict:
+    """Scan the system to search user folders in the whole system. Set full_rescan to true only if the user asks for a fresh full scan."""
+    # drives on windows, /home (or PC_MANAGER_SCAN_ROOTS) elsewhere. each directory is listed
+    # once and the roots and their subtrees are scanned on a thread pool. directories whose
+    # mtime did not change since the last scan are taken from scan_cache.json without listing them
+    scanner = make_scanner(cache_path=SCAN_CACHE_PATH)
+    results = scanner.scan(default_scan_roots(), full=full_rescan)
+    print(f"scan: {scanner.stats}")
+
+    write_summaries(results)
+    if EXPORT_SUMMARIES_JSON:
+        with open(SUMMARIES_JSON_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
 
     return {
         "status": "Done",
-        "file_name": "summaries.json"
+        "file_name": SUMMARIES_DB_PATH,
+        "user_folders_found": len(results),
+        "cache_hits": scanner.stats.get("cache_hits", 0),
+        "cache_misses": scanner.stats.get("cache_misses", 0)
     }
 
 @tool
-def read_summaries_by_folder(folder_name: str) -> dict:
+def read_summaries_by_folder(folder_name: str, offset: int = 0, limit: int = PAGE_SIZE) -> dict:
     """
-    Reads summaries.json and returns all entries whose path
-    contains the given folder name (case-insensitive).
+    Returns the summaries of all user folders with the given name (case-insensitive),
+    at most `limit` paths starting at `offset`. If next_offset is not null, call again
+    with offset=next_offset to get the rest.
     """
 
-    summaries_file = Path("summaries.json")
-    if not summaries_file.exists():
+    if not Path(SUMMARIES_DB_PATH).exists():
         return {
             "folder": folder_name,
             "summary": []
         }
 
-    with summaries_file.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    folder_name_lower = folder_name.lower()
-    matched = {}
-
-    for path_key, summary_list in data.items():
-        if folder_name_lower in path_key.lower():
-            matched[path_key] = summary_list
+    # indexed lookup by folder name instead of parsing the whole scan and matching every path
+    matched, total = read_folder(folder_name, max(0, offset), max(1, limit))
+    next_offset = max(0, offset) + len(matched)
 
     return {
         "folder": f"{folder_name} done",
-        "summaries": matched
+        "summaries": matched,
+        "total": total,
+        "next_offset": next_offset if next_offset < total else None
     }
 
 @tool
@@ -220,30 +164,20 @@ def write_for_analysis(data: dict) -> dict:
         "folder_paths": [list of folder paths],
         "summaries": [list of corresponding summaries]
     }
-    Appends this entry to analysis.json
+    Appends this entry to the analysis log, folder paths already logged for the current scan are skipped
     """
 
-    path = Path("analysis.json")
-
-    if path.exists() and path.stat().st_size > 0:
-        with path.open("r", encoding="utf-8") as f:
-            existing = json.load(f)
-    else:
-        existing = []
-
-    if not isinstance(existing, list):
-        existing = [existing]
-
     # minimal validation
-    entry = {
-        "folder_paths": data.get("folder_paths", []),
-        "summaries": data.get("summaries", [])
-    }
-
-    existing.append(entry)
-
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(existing, f, indent=4)
-
-    return {"status": "appended"}
+    folder_paths = data.get("folder_paths", [])
+    summaries = data.get("summaries", [])
+    if isinstance(folder_paths, str):
+        folder_paths = [folder_paths]
+
+    # one locked line appended to analysis.jsonl, analysis.json is rebuilt from it by compact()
+    # duplicates are skipped per scan, so a later scan can flag a folder again with its new summary
+    entry = analysis_log.append(folder_paths, summaries, current_scan())
+    if entry is None:
+        return {"status": "duplicate", "skipped": folder_paths}
+
+    return {"status": "appended", "folder_paths": entry["folder_paths"]}
 